@@ -0,0 +1,107 @@
+import asyncio
+import math
+from contextlib import asynccontextmanager
+
+from fastapi import HTTPException
+
+from .config import settings
+from .deadline import check_deadline, remaining_seconds
+from .executor import InferenceExecutor, inference_executor
+
+class AdmissionRejected(HTTPException):
+    """Request shed before any decode or inference, with a Retry-After hint"""
+
+    def __init__(self, status_code: int, code: str, message: str, retry_after: int):
+        super().__init__(status_code=status_code, detail=message, headers={"Retry-After": str(retry_after)})
+        self.code = code
+        self.retry_after = retry_after
+
+class AdmissionController:
+    """Bounds queued inference jobs and the decoded pixels held in memory at once
+
+    Requests over the job cap get 429. Requests whose estimated wait, from the
+    jobs ahead of them and the executor's recent service time, exceeds
+    max_wait_seconds or the request's remaining deadline get 503, as do
+    requests still waiting for pixel budget when that time runs out.
+    """
+
+    def __init__(self, max_pixels: int, max_queued: int, max_wait_seconds: float, executor: InferenceExecutor):
+        self.max_pixels = max_pixels
+        self.max_queued = max(1, max_queued)
+        self.max_wait_seconds = max_wait_seconds
+        self.executor = executor
+
+        self.queued = 0  # Jobs admitted or waiting for pixel budget, counted on the event loop
+        self.pixels_in_flight = 0
+        self._loop = None
+        self._condition = None
+
+    def _get_condition(self, loop) -> asyncio.Condition:
+        # Created per event loop so a forked worker never shares a parent's primitives
+        if self._condition is None or self._loop is not loop:
+            self._condition = asyncio.Condition()
+            self._loop = loop
+        return self._condition
+
+    def estimated_wait(self) -> float:
+        """Seconds a new job would wait behind the ones already queued"""
+        if self.executor.service_seconds is None:
+            return 0.0
+        return self.queued / self.executor.max_workers * self.executor.service_seconds
+
+    def _reject(self, status_code: int, code: str, message: str):
+        retry_after = max(1, math.ceil(self.estimated_wait()))
+        raise AdmissionRejected(status_code, code, message, retry_after)
+
+    def check(self):
+        """Reject straight away when the queue is full or the wait would outlast the deadline"""
+        if self.queued >= self.max_queued:
+            self._reject(429, "TOO_MANY_REQUESTS",
+                         f"Too many requests in progress ({self.queued}). Please retry later")
+        if self.estimated_wait() > remaining_seconds(self.max_wait_seconds):
+            self._reject(503, "SERVER_OVERLOADED",
+                         f"Server overloaded: estimated wait {self.estimated_wait():.0f}s. Please retry later")
+
+    def _fits(self, pixels: int) -> bool:
+        # A single image over the budget still runs once nothing else is in flight
+        return self.pixels_in_flight == 0 or self.pixels_in_flight + pixels <= self.max_pixels
+
+    @asynccontextmanager
+    async def admit(self, pixels: int):
+        """Hold a queue slot and pixel budget for the duration of the block"""
+        if not settings.admission_enabled:
+            yield
+            return
+
+        check_deadline("decoding")
+        self.check()
+        condition = self._get_condition(asyncio.get_running_loop())
+        self.queued += 1
+        try:
+            async with condition:
+                if not self._fits(pixels):
+                    try:
+                        await asyncio.wait_for(condition.wait_for(lambda: self._fits(pixels)),
+                                               remaining_seconds(self.max_wait_seconds))
+                    except asyncio.TimeoutError:
+                        check_deadline("decoding")
+                        self._reject(503, "SERVER_OVERLOADED",
+                                     "Server overloaded: too many large images in progress. Please retry later")
+                self.pixels_in_flight += pixels
+
+            try:
+                yield
+            finally:
+                async with condition:
+                    self.pixels_in_flight -= pixels
+                    condition.notify_all()
+        finally:
+            self.queued -= 1
+
+# Initialize the shared admission controller
+admission_controller = AdmissionController(
+    max_pixels=settings.admission_max_pixels,
+    max_queued=settings.admission_max_queued,
+    max_wait_seconds=settings.admission_max_wait_seconds,
+    executor=inference_executor
+)
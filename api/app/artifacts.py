@@ -0,0 +1,188 @@
+import hashlib
+import logging
+import os
+import shutil
+import json
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+from .locking import file_lock
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_SUFFIXES = {"savedmodel": "savedmodel", "tflite": "tflite", "onnx": "onnx"}
+QUANTIZATION_MODES = ("dynamic", "int8")
+HASH_CHUNK_SIZE = 8 * 1024 * 1024
+
+def file_sha256(path: Path) -> str:
+    """Hash a model file without reading it into memory at once"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def artifact_path(model_path: Path, serving_format: str, digest: str,
+                  artifact_dir: Optional[str] = None) -> Path:
+    """Where the converted artifact for one version of an .h5 file lives"""
+    directory = Path(artifact_dir) if artifact_dir else model_path.parent
+    return directory / f"{model_path.stem}.{digest[:16]}.{ARTIFACT_SUFFIXES[serving_format]}"
+
+@contextmanager
+def _conversion_lock(target: Path):
+    # Workers starting together convert each model once between them
+    with file_lock(target.with_name(target.name + ".lock")):
+        yield
+
+def convert_model(model_path: Path, serving_format: str, artifact_dir: Optional[str] = None) -> Path:
+    """Convert an .h5 model once and return the cached artifact path
+
+    Artifacts are keyed by the .h5 content hash, so replacing the file
+    triggers a fresh conversion on the next start.
+    """
+    if serving_format not in ARTIFACT_SUFFIXES:
+        raise ValueError(f"Unsupported serving format: {serving_format}")
+
+    target = artifact_path(model_path, serving_format, file_sha256(model_path), artifact_dir)
+    if target.exists():
+        return target
+
+    target.parent.mkdir(parents=True, exist_ok=True)
+    with _conversion_lock(target):
+        if target.exists():
+            return target
+
+        import tensorflow as tf
+
+        logger.info(f"Converting {model_path.name} to {serving_format}: {target.name}")
+        work_dir = Path(tempfile.mkdtemp(prefix=f".{model_path.stem}.", dir=target.parent))
+        try:
+            model = tf.keras.models.load_model(str(model_path))
+            if serving_format == "onnx":
+                import tf2onnx
+
+                input_spec = (tf.TensorSpec([None] + list(model.input_shape[1:]), tf.float32, name="input"),)
+                tmp_path = work_dir / "model.onnx"
+                tf2onnx.convert.from_keras(model, input_signature=input_spec, opset=13, output_path=str(tmp_path))
+                os.replace(tmp_path, target)
+            else:
+                saved_model_dir = work_dir / "savedmodel"
+                model.export(str(saved_model_dir), verbose=False)
+
+                if serving_format == "savedmodel":
+                    os.replace(saved_model_dir, target)
+                else:
+                    # Converting from the SavedModel freezes the variables into the flatbuffer
+                    converter = tf.lite.TFLiteConverter.from_saved_model(str(saved_model_dir))
+                    tmp_path = work_dir / "model.tflite"
+                    tmp_path.write_bytes(converter.convert())
+                    os.replace(tmp_path, target)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    return target
+
+def quantized_path(model_path: Path, mode: str, digest: str, artifact_dir: Optional[str] = None) -> Path:
+    """Where the quantized TFLite variant of one version of an .h5 file lives"""
+    directory = Path(artifact_dir) if artifact_dir else model_path.parent
+    return directory / f"{model_path.stem}.{digest[:16]}.{mode}.tflite"
+
+def report_path(artifact: Path) -> Path:
+    """Accuracy report written beside a quantized artifact"""
+    return artifact.with_name(artifact.name + ".report.json")
+
+def quantize_model(model_path: Path, mode: str, calibration: Iterable[np.ndarray],
+                   artifact_dir: Optional[str] = None) -> Path:
+    """Build a post-training quantized TFLite variant of an .h5 model
+
+    dynamic stores int8 weights only; int8 also quantizes activations using
+    the calibration batches (1 x H x W x 3 float32). Inputs and outputs stay
+    float32 so the variant is a drop-in replacement.
+    """
+    if mode not in QUANTIZATION_MODES:
+        raise ValueError(f"Unsupported quantization mode: {mode}")
+
+    import tensorflow as tf
+
+    target = quantized_path(model_path, mode, file_sha256(model_path), artifact_dir)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    work_dir = Path(tempfile.mkdtemp(prefix=f".{model_path.stem}.", dir=target.parent))
+    try:
+        model = tf.keras.models.load_model(str(model_path))
+        saved_model_dir = work_dir / "savedmodel"
+        model.export(str(saved_model_dir), verbose=False)
+
+        converter = tf.lite.TFLiteConverter.from_saved_model(str(saved_model_dir))
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        if mode == "int8":
+            calibration = list(calibration)
+            if not calibration:
+                raise ValueError("int8 quantization needs calibration images")
+            converter.representative_dataset = lambda: ([batch.astype(np.float32)] for batch in calibration)
+            converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+
+        tmp_path = work_dir / "model.tflite"
+        tmp_path.write_bytes(converter.convert())
+        os.replace(tmp_path, target)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    # A stale report must never vouch for a freshly converted variant
+    report_path(target).unlink(missing_ok=True)
+    return target
+
+def compare_outputs(reference: np.ndarray, candidate: np.ndarray, features: bool = False) -> Dict[str, float]:
+    """Agreement between float and quantized outputs over the same images
+
+    Probability heads report top-1 agreement and absolute probability drift;
+    feature heads report cosine similarity between the vectors.
+    """
+    reference = np.asarray(reference, dtype=np.float32)
+    candidate = np.asarray(candidate, dtype=np.float32)
+
+    if features:
+        norms = np.linalg.norm(reference, axis=1) * np.linalg.norm(candidate, axis=1)
+        similarity = np.sum(reference * candidate, axis=1) / np.maximum(norms, 1e-12)
+        return {
+            "images": int(reference.shape[0]),
+            "mean_cosine_similarity": float(similarity.mean()),
+            "min_cosine_similarity": float(similarity.min())
+        }
+
+    drift = np.abs(reference - candidate)
+    return {
+        "images": int(reference.shape[0]),
+        "top1_agreement": float(np.mean(reference.argmax(axis=1) == candidate.argmax(axis=1))),
+        "mean_probability_drift": float(drift.mean()),
+        "max_probability_drift": float(drift.max())
+    }
+
+def passes_gate(metrics: Dict[str, float], min_agreement: float, max_drift: float,
+                min_similarity: float) -> bool:
+    """Whether a quantized variant is accurate enough to serve the fast tier"""
+    if "mean_cosine_similarity" in metrics:
+        return metrics["mean_cosine_similarity"] >= min_similarity
+    return metrics["top1_agreement"] >= min_agreement and metrics["mean_probability_drift"] <= max_drift
+
+def write_report(artifact: Path, report: Dict):
+    """Atomically write the accuracy report for a quantized artifact"""
+    path = report_path(artifact)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(report, f, indent=2)
+    os.replace(tmp_path, path)
+
+def read_report(artifact: Path) -> Optional[Dict]:
+    """Accuracy report of a quantized artifact, or None if it was never evaluated"""
+    path = report_path(artifact)
+    if not artifact.exists() or not path.exists():
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
@@ -0,0 +1,208 @@
+import importlib.util
+import threading
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+
+from .artifacts import convert_model
+
+# Whether TensorFlow is installed; import_tensorflow() confirms it can actually be imported
+TENSORFLOW_AVAILABLE = importlib.util.find_spec("tensorflow") is not None
+ONNXRUNTIME_AVAILABLE = importlib.util.find_spec("onnxruntime") is not None
+
+_tensorflow = None
+
+def import_tensorflow():
+    """Import TensorFlow once, marking it unavailable if the install is broken
+
+    A missing native library (such as the Visual C++ runtime on Windows)
+    only shows up on import, so find_spec alone cannot catch it.
+    """
+    global TENSORFLOW_AVAILABLE, _tensorflow
+    if _tensorflow is not None:
+        return _tensorflow
+    if not TENSORFLOW_AVAILABLE:
+        raise ImportError("TensorFlow is not available")
+    try:
+        import tensorflow
+    except Exception as e:
+        TENSORFLOW_AVAILABLE = False
+        raise ImportError(f"TensorFlow is installed but cannot be imported: {e}") from e
+    _tensorflow = tensorflow
+    return tensorflow
+
+class InferenceBackend(ABC):
+    """One loaded model behind a framework-neutral batched interface
+
+    Options a backend has no use for are accepted and ignored, so every
+    backend can be built from the same settings.
+    """
+
+    name = ""
+    requires_tensorflow = True
+
+    def __init__(self, num_threads: int = 0, artifact_dir: Optional[str] = None,
+                 compiled: bool = True, xla_jit: bool = False):
+        self.num_threads = num_threads
+        self.artifact_dir = artifact_dir
+        self.compiled = compiled
+        self.xla_jit = xla_jit
+        self.path = None
+        self.version = None  # Set by the model manager when the model is loaded
+        self.digest = None  # SHA-256 of the source file, used to skip no-op reloads
+
+    @classmethod
+    def available(cls) -> bool:
+        """Whether the runtime this backend needs is installed"""
+        return TENSORFLOW_AVAILABLE
+
+    @abstractmethod
+    def load(self, model_path: Path):
+        """Load a model from its .h5 file or from an artifact in this backend's format"""
+
+    @property
+    @abstractmethod
+    def input_shape(self) -> Tuple[Optional[int], ...]:
+        """Input shape with None for the batch dimension"""
+
+    @abstractmethod
+    def run(self, batch: np.ndarray) -> np.ndarray:
+        """Run one forward pass over an N x H x W x 3 float32 batch"""
+
+    def warmup(self, batch_sizes: Iterable[int]):
+        """Run dummy batches so one-time setup happens before real traffic"""
+        for batch_size in batch_sizes:
+            self.run(np.zeros([batch_size] + list(self.input_shape[1:]), dtype=np.float32))
+
+    def _artifact(self, model_path: Path) -> Path:
+        # .h5 files are converted once and cached; anything else is taken as a ready artifact
+        if model_path.suffix == ".h5":
+            return convert_model(model_path, self.name, self.artifact_dir)
+        return model_path
+
+class KerasBackend(InferenceBackend):
+    """Loads the .h5 file with tf.keras and runs it as a compiled graph function"""
+
+    name = "keras"
+
+    def load(self, model_path: Path):
+        import tensorflow as tf
+
+        self.path = model_path
+        self.model = tf.keras.models.load_model(str(model_path))
+        self._infer = self._compile(tf) if self.compiled else None
+
+    def _compile(self, tf):
+        """Wrap the model in a graph function with a fixed input signature"""
+        input_spec = tf.TensorSpec([None] + list(self.model.input_shape[1:]), tf.float32)
+
+        @tf.function(input_signature=[input_spec], jit_compile=self.xla_jit)
+        def infer(batch):
+            return self.model(batch, training=False)
+
+        return infer
+
+    @property
+    def input_shape(self):
+        return tuple(self.model.input_shape)
+
+    def run(self, batch):
+        if self._infer is None:
+            return self.model.predict(batch)
+        return self._infer(np.asarray(batch, dtype=np.float32)).numpy()
+
+class SavedModelBackend(InferenceBackend):
+    """Serves the exported graph directly, without rebuilding Keras layers"""
+
+    name = "savedmodel"
+
+    def load(self, model_path: Path):
+        import tensorflow as tf
+
+        self.path = self._artifact(model_path)
+        self._loaded = tf.saved_model.load(str(self.path))
+        self._serve = self._loaded.serve
+
+    @property
+    def input_shape(self):
+        return tuple(self._serve.input_signature[0].shape.as_list())
+
+    def run(self, batch):
+        return self._serve(np.asarray(batch, dtype=np.float32)).numpy()
+
+class TFLiteBackend(InferenceBackend):
+    """Runs a TFLite flatbuffer on the default CPU delegate (XNNPACK)"""
+
+    name = "tflite"
+
+    def load(self, model_path: Path):
+        import tensorflow as tf
+
+        self.path = self._artifact(model_path)
+        self._interpreter = tf.lite.Interpreter(
+            model_path=str(self.path), num_threads=self.num_threads if self.num_threads > 0 else None
+        )
+        self._input = self._interpreter.get_input_details()[0]
+        self._output = self._interpreter.get_output_details()[0]
+        self._batch_size = None
+        self._lock = threading.Lock()  # One interpreter cannot run calls concurrently
+
+    @property
+    def input_shape(self):
+        return (None,) + tuple(int(dim) for dim in self._input["shape_signature"][1:])
+
+    def run(self, batch):
+        batch = np.ascontiguousarray(batch, dtype=np.float32)
+        with self._lock:
+            # Tensors are only reallocated when the batch size changes
+            if batch.shape[0] != self._batch_size:
+                self._interpreter.resize_tensor_input(self._input["index"], batch.shape)
+                self._interpreter.allocate_tensors()
+                self._batch_size = batch.shape[0]
+            self._interpreter.set_tensor(self._input["index"], batch)
+            self._interpreter.invoke()
+            return self._interpreter.get_tensor(self._output["index"])
+
+class OnnxBackend(InferenceBackend):
+    """Runs an ONNX export on ONNX Runtime's CPU provider, without TensorFlow"""
+
+    name = "onnx"
+    requires_tensorflow = False
+
+    @classmethod
+    def available(cls) -> bool:
+        return ONNXRUNTIME_AVAILABLE
+
+    def load(self, model_path: Path):
+        import onnxruntime as ort
+
+        # Converting an .h5 needs TensorFlow and tf2onnx; serving a ready .onnx file does not
+        self.path = self._artifact(model_path)
+        options = ort.SessionOptions()
+        if self.num_threads > 0:
+            options.intra_op_num_threads = self.num_threads
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self._session = ort.InferenceSession(str(self.path), options, providers=["CPUExecutionProvider"])
+        self._input = self._session.get_inputs()[0]
+
+    @property
+    def input_shape(self):
+        # Symbolic dimensions such as the batch size come back as strings
+        return tuple(dim if isinstance(dim, int) else None for dim in self._input.shape)
+
+    def run(self, batch):
+        return self._session.run(None, {self._input.name: np.asarray(batch, dtype=np.float32)})[0]
+
+BACKENDS = {
+    backend.name: backend
+    for backend in (KerasBackend, SavedModelBackend, TFLiteBackend, OnnxBackend)
+}
+
+def create_backend(name: str, **options) -> InferenceBackend:
+    """Instantiate a backend by its settings name"""
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown inference backend: {name}. Choose from {', '.join(BACKENDS)}")
+    return BACKENDS[name](**options)
@@ -0,0 +1,130 @@
+import numpy as np
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+class MicroBatcher:
+    """Collect concurrent requests for one model into a single forward pass"""
+
+    def __init__(self, name: str, run_batch: Callable[[np.ndarray], np.ndarray],
+                 max_batch_size: int = 16, max_wait_ms: float = 5.0, buffer_pool=None):
+        self.name = name
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.buffer_pool = buffer_pool
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def submit(self, inputs: np.ndarray) -> Future:
+        """Queue a batch of one or more rows and return a future for its outputs"""
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((inputs, future))
+        return future
+
+    def predict(self, inputs: np.ndarray) -> np.ndarray:
+        """Blocking helper that waits for this caller's rows"""
+        return self.submit(inputs).result()
+
+    def queue_depth(self) -> int:
+        """Number of requests waiting for the next batch"""
+        return self._queue.qsize()
+
+    def shutdown(self, timeout: float = 5.0):
+        """Stop the worker after it drains what is already queued"""
+        with self._lock:
+            thread = self._thread
+            if thread is None or not thread.is_alive() or self._pid != os.getpid():
+                return
+            self._queue.put(_STOP)
+        thread.join(timeout)
+        self._thread = None
+
+    def _ensure_worker(self):
+        # The worker is started lazily (and restarted after fork) because
+        # threads do not survive into forked worker processes
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            if self._pid != os.getpid():
+                self._queue = queue.Queue()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(
+                target=self._worker, name=f"batcher-{self.name}", daemon=True
+            )
+            self._thread.start()
+
+    def _worker(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+
+            batch = [item]
+            rows = item[0].shape[0]
+            deadline = time.monotonic() + self.max_wait
+
+            # Keep collecting until the batch is full or the wait window closes
+            while rows < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+                rows += item[0].shape[0]
+
+            self._run(batch)
+
+    def _run(self, batch):
+        batch = [(inputs, future) for inputs, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+
+        buffer = None
+        try:
+            if len(batch) == 1:
+                inputs = batch[0][0]
+            else:
+                rows = sum(inputs.shape[0] for inputs, _ in batch)
+                row_shape = batch[0][0].shape[1:]
+                if self.buffer_pool is not None:
+                    # Copy rows into a reusable max-size buffer instead of a fresh array
+                    buffer = self.buffer_pool.acquire((max(rows, self.max_batch_size),) + row_shape)
+                    inputs = np.concatenate([inputs for inputs, _ in batch], axis=0, out=buffer[:rows])
+                else:
+                    inputs = np.concatenate([inputs for inputs, _ in batch], axis=0)
+            outputs = self.run_batch(inputs)
+        except Exception as e:
+            logger.error("Batched inference failed for %s: %s", self.name, e)
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        finally:
+            if buffer is not None:
+                self.buffer_pool.release(buffer)
+
+        # Hand each caller back its own rows
+        offset = 0
+        for inputs, future in batch:
+            count = inputs.shape[0]
+            future.set_result(outputs[offset:offset + count])
+            offset += count
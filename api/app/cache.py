@@ -0,0 +1,225 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+from .deadline import DeadlineExceeded
+
+logger = logging.getLogger(__name__)
+
+class ResultCache:
+    """Content-addressed LRU/TTL cache of model results with an optional shared disk tier"""
+
+    DISK_PRUNE_INTERVAL = 256
+
+    def __init__(self, max_entries: int = 10000, max_bytes: int = 64 * 1024 * 1024,
+                 ttl_seconds: float = 3600, disk_dir: Optional[str] = None,
+                 disk_max_bytes: int = 1024 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.disk_max_bytes = disk_max_bytes
+
+        # key -> (expires_at, size_bytes, value)
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._disk_writes = 0
+
+        self.hits = 0
+        self.misses = 0
+
+        if self.disk_dir is not None:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def content_hash(image_bytes: bytes) -> str:
+        """Hash of the uploaded bytes used to address cached results"""
+        return hashlib.sha256(image_bytes).hexdigest()
+
+    @staticmethod
+    def make_key(content_hash: str, model_name: str, model_version: str) -> str:
+        return f"{model_name}-{model_version}-{content_hash}"
+
+    def peek(self, key: str):
+        """Return a cached value or None without counting a hit or miss"""
+        with self._lock:
+            value = self._get_memory(key)
+        if value is None and self.disk_dir is not None:
+            value = self._read_disk(key)
+            if value is not None:
+                self._put_memory(key, value, self._estimate_size(value))
+        return value
+
+    def get(self, key: str):
+        """Return a cached value or None, checking memory before disk"""
+        value = self.peek(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def put(self, key: str, value: Any):
+        """Store a value in memory and, when enabled, in the shared disk tier"""
+        encoded = json.dumps(value) if self.disk_dir is not None else None
+        size = len(encoded) if encoded is not None else self._estimate_size(value)
+        self._put_memory(key, value, size)
+        if encoded is not None:
+            self._write_disk(key, encoded)
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any]):
+        """Return the cached value or compute it once for all concurrent callers
+
+        When the computing request runs out of time or its client goes away,
+        its waiters do not inherit that error: one of them takes over the
+        compute under its own deadline.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        while True:
+            with self._lock:
+                future = self._inflight.get(key)
+                owner = future is None
+                if owner:
+                    future = Future()
+                    self._inflight[key] = future
+
+            if owner:
+                break
+            try:
+                return future.result()
+            except DeadlineExceeded:
+                continue
+
+        try:
+            value = compute()
+        except BaseException as e:
+            self._finish(key, future)
+            future.set_exception(e)
+            raise
+        self.put(key, value)
+        self._finish(key, future)
+        future.set_result(value)
+        return value
+
+    def _finish(self, key: str, future: Future):
+        # Only drop our own entry; a waiter may already have taken over the key
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    def stats(self):
+        """Summary of cache occupancy and hit rate"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+    def _get_memory(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, size, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            self._bytes -= size
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _put_memory(self, key: str, value: Any, size: int):
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, size, value)
+            self._bytes += size
+
+            # Evict least recently used entries until both budgets are met
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+
+    @staticmethod
+    def _estimate_size(value: Any) -> int:
+        # Feature vectors dominate result size, so count floats and add a fixed overhead
+        if isinstance(value, dict):
+            return 256 + sum(ResultCache._estimate_size(v) for v in value.values())
+        if isinstance(value, (list, tuple)):
+            return 64 + 24 * len(value)
+        return 32
+
+    def _disk_path(self, key: str) -> Path:
+        return self.disk_dir / key[-2:] / f"{key}.json"
+
+    def _read_disk(self, key: str):
+        path = self._disk_path(key)
+        try:
+            if time.time() - path.stat().st_mtime > self.ttl_seconds:
+                path.unlink(missing_ok=True)
+                return None
+            with open(path, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        except OSError as e:
+            logger.warning("Result cache disk read failed: %s", e)
+            return None
+
+    def _write_disk(self, key: str, encoded: str):
+        path = self._disk_path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Write then rename so other workers never read a partial file
+            fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                f.write(encoded)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning("Result cache disk write failed: %s", e)
+            return
+
+        self._disk_writes += 1
+        if self._disk_writes % self.DISK_PRUNE_INTERVAL == 0:
+            self._prune_disk()
+
+    def _prune_disk(self):
+        """Remove expired files, then the oldest ones until the disk budget is met"""
+        now = time.time()
+        files = []
+        total = 0
+        for path in self.disk_dir.glob("*/*.json"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            if now - stat.st_mtime > self.ttl_seconds:
+                path.unlink(missing_ok=True)
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+        files.sort()
+        for _, size, path in files:
+            if total <= self.disk_max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
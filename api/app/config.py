@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import Dict, List, Optional
 from pathlib import Path
 
 class Settings(BaseSettings):
@@ -12,10 +12,106 @@ class Settings(BaseSettings):
     classification_model: str = "car_damage_classification_model.h5"
     location_model: str = "ft_model_locn.h5"
     feature_model: str = "ft_model.h5"
+    lazy_models: List[str] = []  # Loaded on first use instead of at startup
+    model_reload_interval_seconds: float = 30.0  # Poll model files and hot-swap changed ones, 0 disables
+    
+    # Inference backend settings
+    inference_backend: str = "keras"  # keras, savedmodel, tflite or onnx
+    model_backends: Dict[str, str] = {}  # Per-model override, e.g. {"features": "onnx"}
+    artifact_dir: Optional[str] = None  # Converted artifacts, defaults to next to each .h5 file
+    backend_num_threads: int = 0  # TFLite and ONNX Runtime threads, 0 uses tf_intra_op_threads
+    
+    # Quantized fast tier settings
+    default_tier: str = "accurate"  # accurate or fast, for requests that do not pick one
+    quantization_mode: str = "int8"  # dynamic or int8 variant served by the fast tier
+    quantization_min_agreement: float = 0.98  # Top-1 agreement with the float model
+    quantization_max_drift: float = 0.05  # Mean absolute probability drift
+    quantization_min_feature_similarity: float = 0.99  # Mean cosine similarity of feature vectors
     
     # API settings
     max_file_size: int = 10 * 1024 * 1024  # 10MB
     allowed_extensions: List[str] = ["jpg", "jpeg", "png", "webp"]
+    max_image_pixels: int = 50_000_000  # Checked from the header before decoding
+    fast_preprocessing: bool = False  # Opt-in: JPEG draft decode, EXIF orientation, float32 output; changes model inputs
+    tensor_input_enabled: bool = True  # Accept client-letterboxed uint8 tensors (input_format=tensor)
+    
+    # Process and threading settings
+    workers: int = 0  # Worker processes started by start_production.py, 0 = one per core
+    tf_intra_op_threads: int = 0  # 0 lets TensorFlow decide
+    tf_inter_op_threads: int = 0
+    
+    # Inference executor settings
+    inference_workers: int = 4  # Raised to batch_max_size when batching is enabled
+    inference_max_pending: int = 64
+    
+    # Admission control settings
+    admission_enabled: bool = True
+    admission_max_pixels: int = 200_000_000  # Decoded pixels in flight per worker (~600MB as RGB)
+    admission_max_queued: int = 64  # Jobs admitted or waiting; more get 429
+    admission_max_wait_seconds: float = 20.0  # Longer estimated waits get 503, under the app's 30s timeout
+    
+    # Request deadline settings
+    request_timeout_seconds: float = 30.0  # Default deadline, matching the mobile client's timeout
+    request_max_timeout_seconds: float = 120.0  # Upper bound for the X-Request-Timeout header
+    
+    # Result cache settings
+    model_version: str = "1.0.0"
+    result_cache_enabled: bool = True
+    result_cache_max_entries: int = 10000
+    result_cache_max_bytes: int = 64 * 1024 * 1024  # 64MB
+    result_cache_ttl_seconds: int = 3600
+    result_cache_dir: Optional[str] = None  # Shared on-disk tier, disabled when unset
+    result_cache_disk_max_bytes: int = 1024 * 1024 * 1024  # 1GB
+    
+    # Async job settings
+    jobs_enabled: bool = True
+    jobs_db_path: str = str(Path(__file__).parent.parent / "data" / "jobs.sqlite3")
+    jobs_workers: int = 1  # Jobs run at once per process, through admission control like requests
+    jobs_max_queued: int = 1000  # More submissions get 429
+    jobs_result_ttl_seconds: int = 3600  # Finished jobs are deleted after this
+    jobs_lease_seconds: float = 300.0  # Renewed while a job runs; retried if not renewed (its worker died)
+    jobs_max_attempts: int = 3
+    jobs_queue_timeout_seconds: float = 3600.0  # Queued jobs no worker started by then are failed
+    jobs_poll_interval_seconds: float = 0.5
+    
+    # Similarity index settings
+    feature_index_enabled: bool = True
+    feature_index_dir: str = str(Path(__file__).parent.parent / "data" / "feature_index")
+    feature_index_dtype: str = "float16"  # float16 or float32
+    feature_index_code_bits: int = 256
+    feature_index_candidates: int = 256  # Shortlist size for approximate search
+    feature_index_flush_rows: int = 64  # New vectors buffered before one write to the shared files
+    feature_index_flush_interval_seconds: float = 5.0  # Longest a new vector stays buffered
+    
+    # Compiled inference settings
+    compiled_inference: bool = True
+    xla_jit: bool = False
+    warmup_on_startup: bool = True
+    warmup_batch_sizes: List[int] = [1]
+    
+    # Inference batching settings
+    batching_enabled: bool = True
+    batch_max_size: int = 16  # Also the minimum inference pool size, so per-image requests can fill a batch
+    batch_max_wait_ms: float = 5.0
+    batch_max_images: int = 32  # Images accepted by /batch-analysis per request
+    buffer_pool_size: int = 32  # Free preallocated buffers kept per shape
+    
+    # Observability settings
+    metrics_enabled: bool = True  # Per-worker Prometheus metrics at /metrics
+    
+    # Logging settings
+    log_level: str = "INFO"
+    log_file: Optional[str] = None  # Rotating log file, stdout only when unset
+    log_max_bytes: int = 10 * 1024 * 1024  # 10MB per file before rotating
+    log_backup_count: int = 5
+    log_queue_size: int = 10000  # Records waiting for the writer thread; extra records are dropped
+    log_rate_limit_per_second: float = 5.0  # Per message template, for DEBUG lines
+    request_log_enabled: bool = True  # One summary line per request with its correlation ID
+    
+    # Response encoding settings
+    compression_min_bytes: int = 1024  # Smaller bodies are sent uncompressed
+    gzip_level: int = 5
+    brotli_quality: int = 4
     
     # CORS settings
     allowed_origins: List[str] = ["*"]
@@ -0,0 +1,130 @@
+import asyncio
+import contextvars
+import threading
+import time
+
+from fastapi import HTTPException
+
+from .config import settings
+
+TIMEOUT_HEADER = b"x-request-timeout"
+
+class DeadlineExceeded(HTTPException):
+    """Request dropped between stages because its deadline passed"""
+
+    code = "DEADLINE_EXCEEDED"
+
+    def __init__(self, stage: str):
+        super().__init__(status_code=504, detail=f"Request deadline exceeded before {stage}")
+        self.stage = stage
+
+class ClientDisconnected(DeadlineExceeded):
+    """Request dropped between stages because the client went away"""
+
+    code = "CLIENT_DISCONNECTED"
+
+    def __init__(self, stage: str):
+        super().__init__(stage)
+        self.status_code = 499  # nginx's "client closed request"; never reaches the client
+        self.detail = f"Client disconnected before {stage}"
+
+class RequestDeadline:
+    """Expiry time and disconnect flag of one request, checked from any thread"""
+
+    def __init__(self, timeout_seconds: float):
+        self.expires_at = time.monotonic() + timeout_seconds
+        self._disconnected = threading.Event()
+
+    def remaining(self) -> float:
+        return self.expires_at - time.monotonic()
+
+    def disconnect(self):
+        self._disconnected.set()
+
+    @property
+    def disconnected(self) -> bool:
+        return self._disconnected.is_set()
+
+    def check(self, stage: str):
+        """Raise if the request should be dropped before the named stage"""
+        if self._disconnected.is_set():
+            raise ClientDisconnected(stage)
+        if time.monotonic() >= self.expires_at:
+            raise DeadlineExceeded(stage)
+
+# Deadline of the request being handled; copied into executor threads with the context
+_deadline: contextvars.ContextVar = contextvars.ContextVar("request_deadline", default=None)
+
+def check_deadline(stage: str):
+    """Drop the current request's work before a stage if it is expired or abandoned"""
+    deadline = _deadline.get()
+    if deadline is not None:
+        deadline.check(stage)
+
+def remaining_seconds(default: float) -> float:
+    """Time left on the current request's deadline, capped at default"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return default
+    return max(0.0, min(default, deadline.remaining()))
+
+def _request_timeout(scope) -> float:
+    for name, value in scope.get("headers", ()):
+        if name == TIMEOUT_HEADER:
+            try:
+                timeout = float(value.decode("latin-1"))
+            except ValueError:
+                break
+            if timeout > 0:
+                return min(timeout, settings.request_max_timeout_seconds)
+            break
+    return settings.request_timeout_seconds
+
+class DeadlineMiddleware:
+    """ASGI middleware giving each request a deadline and watching for client disconnects
+
+    Once the app has read the whole body, a watcher task takes over the
+    receive channel so a disconnect is seen while the request is still being
+    processed. Later receive calls from the app wait on the same signal.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        deadline = RequestDeadline(_request_timeout(scope))
+        disconnected = asyncio.Event()
+        watcher = None
+
+        async def watch_disconnect():
+            while True:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    deadline.disconnect()
+                    disconnected.set()
+                    return
+
+        async def receive_and_watch():
+            nonlocal watcher
+            if watcher is not None:
+                await disconnected.wait()
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                deadline.disconnect()
+                disconnected.set()
+            elif not message.get("more_body", False):
+                watcher = asyncio.ensure_future(watch_disconnect())
+            return message
+
+        token = _deadline.set(deadline)
+        try:
+            await self.app(scope, receive_and_watch, send)
+        finally:
+            _deadline.reset(token)
+            if watcher is not None:
+                watcher.cancel()
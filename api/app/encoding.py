@@ -0,0 +1,130 @@
+import gzip
+import json
+import time
+from typing import Any, List, Optional, Sequence
+
+import numpy as np
+from fastapi import Request
+from fastapi.responses import Response
+
+from .config import settings
+from .metrics import STAGE_DURATION
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+FLOAT32 = "application/x-float32"
+FLOAT16 = "application/x-float16"
+
+# Alternative spellings clients send for the same formats
+MEDIA_TYPE_ALIASES = {
+    "application/x-msgpack": MSGPACK,
+    "application/vnd.msgpack": MSGPACK,
+}
+
+def parse_header_values(header: Optional[str]) -> List[str]:
+    """Values of an Accept or Accept-Encoding header, best quality first"""
+    values = []
+    for position, part in enumerate((header or "").split(",")):
+        fields = [field.strip() for field in part.split(";")]
+        if not fields[0]:
+            continue
+        quality = 1.0
+        for field in fields[1:]:
+            if field.startswith("q="):
+                try:
+                    quality = float(field[2:])
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            values.append((-quality, position, fields[0].lower()))
+    return [value for _, _, value in sorted(values)]
+
+def negotiate_media_type(accept: Optional[str], vector_available: bool = False) -> str:
+    """Pick the response format from the Accept header, falling back to JSON"""
+    for media_type in parse_header_values(accept):
+        media_type = MEDIA_TYPE_ALIASES.get(media_type, media_type)
+        if media_type in (JSON, "application/*", "*/*"):
+            return JSON
+        if media_type == MSGPACK and MSGPACK_AVAILABLE:
+            return MSGPACK
+        if media_type in (FLOAT32, FLOAT16) and vector_available:
+            return media_type
+    return JSON
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Pick a content coding the client accepts, preferring brotli"""
+    codings = parse_header_values(accept_encoding)
+    if BROTLI_AVAILABLE and "br" in codings:
+        return "br"
+    if "gzip" in codings:
+        return "gzip"
+    return None
+
+def dumps_json(content: Any) -> bytes:
+    """Serialize to JSON with orjson when installed"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(content).encode("utf-8")
+
+def encode_body(content: Any, media_type: str, vector: Optional[Sequence[float]] = None) -> bytes:
+    """Serialize a response body in the negotiated format"""
+    if media_type == MSGPACK:
+        # Single-precision floats halve the size of feature vectors and probabilities
+        return msgpack.packb(content, use_single_float=True)
+    if media_type == FLOAT32:
+        return np.asarray(vector, dtype="<f4").tobytes()
+    if media_type == FLOAT16:
+        return np.asarray(vector, dtype="<f2").tobytes()
+    return dumps_json(content)
+
+def compress_body(body: bytes, encoding: Optional[str]) -> bytes:
+    """Compress a body with the negotiated content coding"""
+    if encoding == "br":
+        return brotli.compress(body, quality=settings.brotli_quality)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=settings.gzip_level)
+    return body
+
+def encoded_response(request: Request, content: Any, status_code: int = 200,
+                     vector: Optional[Sequence[float]] = None) -> Response:
+    """Build a response in the format and content coding the client asked for
+
+    vector enables the raw float32/float16 formats, whose body is just the
+    little-endian vector; the other response fields move to X- headers.
+    """
+    started = time.perf_counter()
+    media_type = negotiate_media_type(request.headers.get("accept"), vector is not None)
+    body = encode_body(content, media_type, vector)
+
+    headers = {"Vary": "Accept, Accept-Encoding"}
+    if media_type in (FLOAT32, FLOAT16):
+        headers["X-Feature-Count"] = str(len(vector))
+        for key, value in content.get("metadata", {}).items():
+            headers[f"X-{key.replace('_', '-').title()}"] = str(value)
+
+    if len(body) >= settings.compression_min_bytes:
+        encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+        if encoding is not None:
+            body = compress_body(body, encoding)
+            headers["Content-Encoding"] = encoding
+
+    STAGE_DURATION.observe(time.perf_counter() - started, stage="serialization")
+    return Response(content=body, status_code=status_code, media_type=media_type, headers=headers)
@@ -0,0 +1,90 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .config import settings
+from .deadline import check_deadline
+
+logger = logging.getLogger(__name__)
+
+class InferenceExecutor:
+    """Bounded thread pool that keeps decoding and inference off the event loop"""
+
+    def __init__(self, max_workers: int, max_pending: int):
+        self.max_workers = max(1, max_workers)
+        self.max_pending = max(self.max_workers, max_pending)
+
+        self._executor = None
+        self._pid = None
+        self._loop = None
+        self._slots = None
+        self.pending = 0  # Calls waiting for a slot or running, counted on the event loop
+        self.service_seconds = None  # Moving average of one call's run time in a worker thread
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # Created lazily so a forked worker never inherits a parent's pool
+        if self._executor is None or self._pid != os.getpid():
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="inference"
+            )
+            self._pid = os.getpid()
+        return self._executor
+
+    def _get_slots(self, loop) -> asyncio.Semaphore:
+        if self._slots is None or self._loop is not loop:
+            self._slots = asyncio.Semaphore(self.max_pending)
+            self._loop = loop
+        return self._slots
+
+    async def run(self, func, *args, **kwargs):
+        """Run a blocking call in the pool, waiting on the loop if the pool is saturated"""
+        loop = asyncio.get_running_loop()
+        self.pending += 1
+        try:
+            async with self._get_slots(loop):
+                # Carry the request's context (correlation ID) into the worker thread
+                context = contextvars.copy_context()
+                return await loop.run_in_executor(
+                    self._get_executor(), functools.partial(context.run, self._timed, func, *args, **kwargs)
+                )
+        finally:
+            self.pending -= 1
+
+    def _timed(self, func, *args, **kwargs):
+        # Work whose request expired or disconnected while queued is dropped unrun
+        check_deadline("decoding")
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.service_seconds = elapsed if self.service_seconds is None else (
+                0.8 * self.service_seconds + 0.2 * elapsed
+            )
+    
+    def shutdown(self, wait: bool = True):
+        """Finish running jobs, drop queued ones and release the worker threads"""
+        if self._executor is not None and self._pid == os.getpid():
+            logger.info("Shutting down inference executor")
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+        self._executor = None
+
+def pool_size() -> int:
+    """Threads in the inference pool
+    
+    A thread stays blocked on its batcher future for the whole forward pass,
+    so with batching on the pool must let batch_max_size single-image callers
+    wait at once, or per-image endpoints could never fill a batch.
+    """
+    if settings.batching_enabled:
+        return max(settings.inference_workers, settings.batch_max_size)
+    return settings.inference_workers
+
+# Initialize the shared inference executor
+inference_executor = InferenceExecutor(
+    max_workers=pool_size(),
+    max_pending=settings.inference_max_pending
+)
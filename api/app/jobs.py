@@ -0,0 +1,343 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from .admission import AdmissionRejected
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    params TEXT NOT NULL,
+    image BLOB,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    heartbeat_at REAL,
+    finished_at REAL,
+    expires_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at);
+CREATE INDEX IF NOT EXISTS jobs_expires ON jobs (expires_at);
+"""
+
+class JobStore:
+    """Durable job queue and result store in one SQLite file shared by all workers
+
+    Jobs move queued -> running -> succeeded or failed. The upload is kept only
+    until the job finishes, and finished jobs are deleted once their result TTL
+    passes. Workers renew the lease of a running job while it runs; a job
+    whose lease expires (its worker died) is queued again until max_attempts.
+    Jobs still queued after queue_timeout_seconds (no worker could start them,
+    e.g. a model failed to load) are failed.
+    """
+
+    def __init__(self, db_path: str, result_ttl_seconds: float = 3600, lease_seconds: float = 300,
+                 max_attempts: int = 3, queue_timeout_seconds: float = 3600):
+        self.db_path = Path(db_path)
+        self.result_ttl_seconds = result_ttl_seconds
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max(1, max_attempts)
+        self.queue_timeout_seconds = queue_timeout_seconds
+        self._initialized = False
+        self._init_lock = threading.Lock()
+
+    @contextmanager
+    def _connect(self):
+        # One short-lived connection per operation keeps the store thread- and fork-safe
+        self._ensure_schema()
+        connection = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+        try:
+            yield connection
+        finally:
+            connection.close()
+
+    def _ensure_schema(self):
+        if self._initialized:
+            return
+        with self._init_lock:
+            if self._initialized:
+                return
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+            try:
+                # WAL lets pollers read while a worker writes
+                connection.execute("PRAGMA journal_mode=WAL")
+                connection.executescript(SCHEMA)
+            finally:
+                connection.close()
+            self._initialized = True
+
+    def submit(self, kind: str, params: Dict[str, Any], image: bytes) -> Dict[str, Any]:
+        """Queue a job and return its public record"""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT INTO jobs (id, kind, status, params, image, created_at) VALUES (?, ?, 'queued', ?, ?, ?)",
+                (job_id, kind, json.dumps(params), sqlite3.Binary(image), now)
+            )
+        return {"job_id": job_id, "kind": kind, "status": "queued", "created_at": now}
+
+    def queued_count(self) -> int:
+        """Jobs waiting for a worker"""
+        with self._connect() as connection:
+            return connection.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+
+    def claim(self, worker: str) -> Optional[Dict[str, Any]]:
+        """Take the oldest queued job for this worker, or None when the queue is empty"""
+        with self._connect() as connection:
+            # IMMEDIATE takes the write lock up front so two workers never claim the same job
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                row = connection.execute(
+                    "SELECT id, kind, params, image FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+                ).fetchone()
+                if row is None:
+                    connection.execute("COMMIT")
+                    return None
+                now = time.time()
+                connection.execute(
+                    "UPDATE jobs SET status = 'running', worker = ?, started_at = ?, heartbeat_at = ?, "
+                    "attempts = attempts + 1 WHERE id = ?",
+                    (worker, now, now, row[0])
+                )
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+        return {"job_id": row[0], "kind": row[1], "params": json.loads(row[2]), "image": bytes(row[3])}
+
+    def renew(self, job_id: str, worker: str) -> bool:
+        """Extend a running job's lease; False if the job is no longer this worker's"""
+        with self._connect() as connection:
+            return connection.execute(
+                "UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND worker = ? AND status = 'running'",
+                (time.time(), job_id, worker)
+            ).rowcount > 0
+
+    def release(self, job_id: str, worker: str):
+        """Put a claimed job back in the queue without counting the attempt"""
+        with self._connect() as connection:
+            connection.execute(
+                "UPDATE jobs SET status = 'queued', worker = NULL, attempts = attempts - 1 "
+                "WHERE id = ? AND worker = ? AND status = 'running'",
+                (job_id, worker)
+            )
+
+    def complete(self, job_id: str, worker: str, result: Optional[bytes] = None,
+                 error: Optional[Dict[str, Any]] = None):
+        """Store a job's JSON result or error, drop its upload and start its TTL
+
+        Ignored if the job's lease was lost and another worker took it over.
+        """
+        now = time.time()
+        with self._connect() as connection:
+            connection.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, image = NULL, finished_at = ?, expires_at = ? "
+                "WHERE id = ? AND worker = ? AND status = 'running'",
+                (
+                    "failed" if error is not None else "succeeded",
+                    result.decode("utf-8") if result is not None else None,
+                    json.dumps(error) if error is not None else None,
+                    now, now + self.result_ttl_seconds, job_id, worker
+                )
+            )
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Public record of a job, with its result or error once finished"""
+        with self._connect() as connection:
+            row = connection.execute(
+                "SELECT id, kind, status, result, error, attempts, created_at, started_at, finished_at, expires_at "
+                "FROM jobs WHERE id = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (job_id, time.time())
+            ).fetchone()
+        if row is None:
+            return None
+
+        job = {
+            "job_id": row[0],
+            "kind": row[1],
+            "status": row[2],
+            "attempts": row[5],
+            "created_at": row[6],
+            "started_at": row[7],
+            "finished_at": row[8],
+            "expires_at": row[9]
+        }
+        if row[3] is not None:
+            job["result"] = json.loads(row[3])
+        if row[4] is not None:
+            job["error"] = json.loads(row[4])
+        return job
+
+    def maintain(self):
+        """Delete expired jobs, fail jobs queued too long and requeue, or fail, running jobs whose lease ran out"""
+        now = time.time()
+        with self._connect() as connection:
+            expired = connection.execute("DELETE FROM jobs WHERE expires_at <= ?", (now,)).rowcount
+            stale = now - self.lease_seconds
+            connection.execute(
+                "UPDATE jobs SET status = 'queued', worker = NULL "
+                "WHERE status = 'running' AND COALESCE(heartbeat_at, started_at) < ? AND attempts < ?",
+                (stale, self.max_attempts)
+            )
+            connection.execute(
+                "UPDATE jobs SET status = 'failed', image = NULL, finished_at = ?, expires_at = ?, error = ? "
+                "WHERE status = 'running' AND COALESCE(heartbeat_at, started_at) < ?",
+                (now, now + self.result_ttl_seconds,
+                 json.dumps({"code": "JOB_ABANDONED", "message": "Job did not finish after repeated attempts"}),
+                 stale)
+            )
+            timed_out = connection.execute(
+                "UPDATE jobs SET status = 'failed', image = NULL, finished_at = ?, expires_at = ?, error = ? "
+                "WHERE status = 'queued' AND created_at < ?",
+                (now, now + self.result_ttl_seconds,
+                 json.dumps({"code": "JOB_TIMEOUT",
+                             "message": f"Job was not started within {self.queue_timeout_seconds:.0f}s"}),
+                 now - self.queue_timeout_seconds)
+            ).rowcount
+        if expired:
+            logger.info("Removed %d expired jobs", expired)
+        if timed_out:
+            logger.warning("Failed %d jobs that no worker started in time", timed_out)
+
+class JobRunner:
+    """Worker tasks on the server's event loop that claim jobs from the store and run the matching handler
+
+    Handlers are coroutines, so jobs go through the same admission control and
+    inference executor as HTTP requests. A job the admission controller sheds is
+    put back in the queue and retried after its Retry-After hint. While a job
+    runs, its lease is renewed every third of the lease so it is never handed
+    to a second worker.
+    """
+
+    MAINTENANCE_INTERVAL = 60.0
+
+    def __init__(self, store: JobStore, handlers: Dict[str, Callable[[Dict[str, Any], bytes], Awaitable[bytes]]],
+                 workers: int = 1, poll_interval: float = 0.5, ready: Optional[Callable[[], bool]] = None):
+        self.store = store
+        self.handlers = handlers
+        self.workers = max(1, workers)
+        self.poll_interval = poll_interval
+        self.ready = ready or (lambda: True)
+
+        self._wakeup = None
+        self._stopping = False
+        self._tasks = []
+        self._last_maintenance = 0.0
+
+    @property
+    def running(self) -> bool:
+        """Whether this process has workers taking jobs"""
+        return bool(self._tasks) and not self._stopping
+
+    def start(self):
+        """Start the worker tasks on the running event loop"""
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._tasks = [
+            asyncio.ensure_future(self._worker(f"{os.getpid()}-{index}"))
+            for index in range(self.workers)
+        ]
+
+    def notify(self):
+        """Wake an idle worker after a job was submitted in this process"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def shutdown(self, timeout: float = 5.0):
+        """Stop taking jobs and wait for the running ones to finish
+
+        Jobs still running after the timeout are cancelled; their lease runs
+        out and another worker picks them up.
+        """
+        self._stopping = True
+        self.notify()
+        if self._tasks:
+            _, pending = await asyncio.wait(self._tasks, timeout=timeout)
+            for task in pending:
+                task.cancel()
+        self._tasks = []
+
+    async def _worker(self, worker: str):
+        while not self._stopping:
+            job = None
+            try:
+                if time.time() - self._last_maintenance > self.MAINTENANCE_INTERVAL:
+                    self._last_maintenance = time.time()
+                    await asyncio.to_thread(self.store.maintain)
+                if self.ready():
+                    job = await asyncio.to_thread(self.store.claim, worker)
+            except Exception as e:
+                logger.error("Job queue error: %s", e)
+
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+            await self._run(job, worker)
+
+    async def _renew_lease(self, job_id: str, worker: str):
+        interval = max(1.0, self.store.lease_seconds / 3)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if not await asyncio.to_thread(self.store.renew, job_id, worker):
+                    logger.warning("Job %s lease lost by worker %s", job_id, worker)
+                    return
+            except Exception as e:
+                logger.error("Could not renew lease of job %s: %s", job_id, e)
+
+    async def _run(self, job: Dict[str, Any], worker: str):
+        job_id = job["job_id"]
+        handler = self.handlers.get(job["kind"])
+        heartbeat = asyncio.ensure_future(self._renew_lease(job_id, worker))
+        try:
+            if handler is None:
+                raise ValueError(f"Unknown job kind: {job['kind']}")
+            result = await handler(job["params"], job["image"])
+            await asyncio.to_thread(self.store.complete, job_id, worker, result=result)
+        except AdmissionRejected as e:
+            logger.info("Job %s deferred: %s", job_id, e.detail)
+            try:
+                await asyncio.to_thread(self.store.release, job_id, worker)
+            except Exception as store_error:
+                logger.error("Could not requeue job %s: %s", job_id, store_error)
+            await asyncio.sleep(e.retry_after)
+        except Exception as e:
+            logger.error("Job %s failed: %s", job_id, e)
+            code = "MODEL_ERROR" if isinstance(e, ValueError) else "ANALYSIS_ERROR"
+            try:
+                await asyncio.to_thread(self.store.complete, job_id, worker, error={"code": code, "message": str(e)})
+            except Exception as store_error:
+                logger.error("Could not record failure of job %s: %s", job_id, store_error)
+        finally:
+            heartbeat.cancel()
+
+# Initialize the shared job store
+job_store = JobStore(
+    settings.jobs_db_path,
+    result_ttl_seconds=settings.jobs_result_ttl_seconds,
+    lease_seconds=settings.jobs_lease_seconds,
+    max_attempts=settings.jobs_max_attempts,
+    queue_timeout_seconds=settings.jobs_queue_timeout_seconds
+)
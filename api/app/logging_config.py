@@ -0,0 +1,198 @@
+import contextvars
+import logging
+import os
+import queue
+import re
+import sys
+import threading
+import time
+import uuid
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Optional
+
+from .config import settings
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s'
+REQUEST_ID_HEADER = "x-request-id"
+
+# Client-supplied IDs are echoed into logs and headers, so only short safe tokens are kept
+_VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+
+# Correlation ID and summary fields of the request being handled
+_request_id: contextvars.ContextVar = contextvars.ContextVar("request_id", default="-")
+_request_fields: contextvars.ContextVar = contextvars.ContextVar("request_log_fields", default=None)
+
+summary_logger = logging.getLogger("app.requests")
+
+class RequestIdFilter(logging.Filter):
+    """Stamp every record with the correlation ID of the request that logged it"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = _request_id.get()
+        return True
+
+class RateLimitFilter(logging.Filter):
+    """Let at most `per_second` records per message template through at or below max_level
+
+    Keyed on the unformatted message, so hot-path lines must use lazy %-style
+    arguments. The first record after a throttled second reports how many
+    were dropped. Warnings and errors are never throttled.
+    """
+
+    def __init__(self, per_second: float, max_level: int = logging.DEBUG):
+        super().__init__()
+        self.per_second = per_second
+        self.max_level = max_level
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > self.max_level or self.per_second <= 0:
+            return True
+
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= 1.0:
+                suppressed = window[2] if window is not None else 0
+                self._windows[key] = [now, 1, 0]
+            elif window[1] < self.per_second:
+                window[1] += 1
+                suppressed = 0
+            else:
+                window[2] += 1
+                return False
+
+        if suppressed:
+            record.msg = f"{record.msg} ({suppressed} similar messages suppressed)"
+        return True
+
+class DroppingQueueHandler(QueueHandler):
+    """Queue handler that drops records instead of blocking when the writer falls behind"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+_queue_handler: Optional[DroppingQueueHandler] = None
+_listener: Optional[QueueListener] = None
+
+def configure_logging(log_file: Optional[str] = None):
+    """Route all logging through a bounded queue drained by a background writer thread
+
+    Request threads only format and enqueue records; stdout and the rotating
+    log file are written by the listener. Safe to call more than once: the
+    first call wins.
+    """
+    global _queue_handler, _listener
+    if _listener is not None:
+        return
+
+    formatter = logging.Formatter(LOG_FORMAT)
+    handlers = [logging.StreamHandler(sys.stdout)]
+    log_file = log_file or settings.log_file
+    if log_file:
+        handlers.append(RotatingFileHandler(
+            log_file, maxBytes=settings.log_max_bytes, backupCount=settings.log_backup_count
+        ))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    _queue_handler = DroppingQueueHandler(queue.Queue(maxsize=settings.log_queue_size))
+    _queue_handler.addFilter(RequestIdFilter())
+    _queue_handler.addFilter(RateLimitFilter(settings.log_rate_limit_per_second))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_queue_handler)
+    root.setLevel(settings.log_level.upper())
+
+    _listener = QueueListener(_queue_handler.queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+def _restart_listener_after_fork():
+    # The writer thread does not survive fork; give the child a fresh queue and writer
+    global _listener
+    if _listener is None:
+        return
+    _queue_handler.queue = queue.Queue(maxsize=settings.log_queue_size)
+    _listener = QueueListener(_queue_handler.queue, *_listener.handlers, respect_handler_level=True)
+    _listener.start()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_listener_after_fork)
+
+def stop_logging():
+    """Flush queued records and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+def annotate_request(**fields):
+    """Add fields to the current request's summary line"""
+    current = _request_fields.get()
+    if current is not None:
+        current.update(fields)
+
+def _format_field(value) -> str:
+    if isinstance(value, float):
+        return f"{value:.4g}"
+    text = str(value)
+    return f'"{text}"' if " " in text or not text else text
+
+class RequestLoggingMiddleware:
+    """ASGI middleware assigning a correlation ID and logging one summary line per request"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope.get("headers", ()):
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")
+                break
+        if request_id is None or not _VALID_REQUEST_ID.match(request_id):
+            request_id = uuid.uuid4().hex
+
+        fields = {}
+        response_status = [500]
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                response_status[0] = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [
+                    (REQUEST_ID_HEADER.encode("latin-1"), request_id.encode("latin-1"))
+                ]
+            await send(message)
+
+        id_token = _request_id.set(request_id)
+        fields_token = _request_fields.set(fields)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            if settings.request_log_enabled and summary_logger.isEnabledFor(logging.INFO):
+                summary = {
+                    "method": scope.get("method", ""),
+                    "path": scope.get("path", ""),
+                    "status": response_status[0],
+                    "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+                    **fields
+                }
+                summary_logger.info("%s", " ".join(f"{key}={_format_field(value)}" for key, value in summary.items()))
+            _request_fields.reset(fields_token)
+            _request_id.reset(id_token)
@@ -1,17 +1,32 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException, Query
+from fastapi import FastAPI, File, UploadFile, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 import logging
-from typing import Optional
+from typing import List, Optional
+import asyncio
+import math
 import time
-import numpy as np
 
 from .config import settings
 from .model_loader import model_manager
-from .utils import validate_image_file, format_response, format_comprehensive_response, create_error_response
+from .executor import inference_executor
+from .admission import AdmissionRejected, admission_controller
+from .deadline import DeadlineExceeded, DeadlineMiddleware, check_deadline
+from .jobs import JobRunner, job_store
+from .preprocessing import LetterboxedTensor
+from .encoding import dumps_json, encoded_response
+from .metrics import (
+    MetricsMiddleware, MODELS_LOADED, QUEUE_DEPTH, RESULT_CACHE_LOOKUPS, RESULT_CACHE_SIZE, record_error, registry
+)
+from .logging_config import RequestLoggingMiddleware, annotate_request, configure_logging, stop_logging
+from .utils import (
+    read_image_upload, read_tensor_upload, image_pixels, format_response, format_comprehensive_response,
+    filter_analysis_result, create_error_response
+)
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Configure logging: queued writes, rotating file when LOG_FILE is set
+configure_logging()
 logger = logging.getLogger(__name__)
 
 # Initialize FastAPI app
@@ -32,6 +47,96 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(DeadlineMiddleware)
+
+if settings.metrics_enabled:
+    app.add_middleware(MetricsMiddleware)
+
+# Outermost, so the summary line covers the whole request
+app.add_middleware(RequestLoggingMiddleware)
+
+def queue_depths():
+    """Executor backlog plus each model batcher's waiting requests"""
+    depths = {("executor",): inference_executor.pending, ("admission",): admission_controller.queued}
+    for model_name, batcher in model_manager.batchers.items():
+        depths[(f"batcher_{model_name}",)] = batcher.queue_depth()
+    for model_name, batcher in model_manager.fast_batchers.items():
+        depths[(f"batcher_{model_name}_fast",)] = batcher.queue_depth()
+    return depths
+
+QUEUE_DEPTH.set_function(queue_depths)
+MODELS_LOADED.set_function(lambda: len(model_manager.models))
+
+if model_manager.result_cache is not None:
+    def result_cache_lookups():
+        stats = model_manager.result_cache.stats()
+        return {("hit",): stats["hits"], ("miss",): stats["misses"]}
+    
+    def result_cache_size():
+        stats = model_manager.result_cache.stats()
+        return {("entries",): stats["entries"], ("bytes",): stats["bytes"]}
+    
+    RESULT_CACHE_LOOKUPS.set_function(result_cache_lookups)
+    RESULT_CACHE_SIZE.set_function(result_cache_size)
+
+def served_tier(model_names, tier: Optional[str]) -> str:
+    """Tier reported in metadata: fast if any head ran its quantized variant"""
+    tiers = {model_manager.serving_tier(name, tier) for name in model_names}
+    return "fast" if "fast" in tiers else "accurate"
+
+INPUT_FORMAT_PATTERN = "^(image|tensor)$"
+INPUT_FORMAT_DESCRIPTION = ("'image' (JPG, PNG, WEBP) or 'tensor': raw uint8 H x W x 3 RGB pixels already "
+                            "letterboxed to the model input shape listed under input_formats in /health")
+
+async def read_input(file: UploadFile, input_format: Optional[str], model_names):
+    """Read an image upload, or a client-letterboxed tensor shaped for the given heads"""
+    if input_format != "tensor":
+        return await read_image_upload(file)
+    if not settings.tensor_input_enabled:
+        raise HTTPException(status_code=400, detail="Tensor input is disabled")
+    
+    shape = model_manager.tensor_shape(model_names)
+    if shape is None:
+        raise HTTPException(status_code=400, detail="Tensor input needs one input size; these models differ")
+    return await read_tensor_upload(file, shape)
+
+async def run_analysis_job(params, image_bytes: bytes) -> bytes:
+    """Job handler: the JSON body /comprehensive-analysis would have returned"""
+    if params.get("tensor_shape"):
+        image_bytes = LetterboxedTensor(image_bytes, params["tensor_shape"])
+    async with admission_controller.admit(image_pixels(image_bytes)):
+        analysis_result = await inference_executor.run(model_manager.comprehensive_analysis, image_bytes,
+                                                       tier=params["tier"])
+    analysis_result = filter_analysis_result(analysis_result, params["models"])
+    response = format_comprehensive_response(analysis_result, params["include_probabilities"])
+    response["metadata"]["tier"] = served_tier(model_manager.models, params["tier"])
+    return dumps_json(response)
+
+job_runner = JobRunner(
+    job_store,
+    {"comprehensive-analysis": run_analysis_job},
+    workers=settings.jobs_workers,
+    poll_interval=settings.jobs_poll_interval_seconds,
+    ready=lambda: model_manager.readiness()["ready"]
+)
+
+@app.on_event("startup")
+async def startup_event():
+    """Start loading models in the background so the server can answer right away"""
+    if model_manager.inference_available:
+        model_manager.start_background_loading()
+        model_manager.start_reload_watcher()
+        if settings.jobs_enabled:
+            job_runner.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background inference workers"""
+    await job_runner.shutdown()
+    inference_executor.shutdown()
+    model_manager.shutdown()
+    stop_logging()
+
 @app.get("/")
 async def root():
     """Health check endpoint"""
@@ -48,21 +153,31 @@ async def health_check():
     health_data = {
         "status": "healthy",
         "tensorflow_available": model_manager.tensorflow_available,
+        "inference_available": model_manager.inference_available,
         "models_loaded": len(model_manager.models),
         "available_models": list(model_manager.models.keys()),
+        "models": model_manager.readiness()["models"],
+        "input_formats": {
+            "image": {"extensions": settings.allowed_extensions, "max_bytes": settings.max_file_size},
+            "tensor": model_manager.tensor_input_spec()
+        },
         "available_endpoints": [
             "/predict-damage", 
             "/predict-location", 
             "/extract-features",
-            "/comprehensive-analysis"
+            "/similar-images",
+            "/comprehensive-analysis",
+            "/batch-analysis",
+            "/jobs/comprehensive-analysis",
+            "/jobs/{job_id}"
         ],
         "timestamp": time.time()
     }
     
-    # Add warnings if TensorFlow is not available
-    if not model_manager.tensorflow_available:
+    # Add warnings if no inference backend is available
+    if not model_manager.inference_available:
         health_data["warnings"] = [
-            "TensorFlow not available - ML prediction endpoints will not work",
+            "No inference backend (TensorFlow or ONNX Runtime) available - ML prediction endpoints will not work",
             "This is often due to missing Visual C++ redistributables on Windows",
             "API is running but ML functionality is disabled"
         ]
@@ -70,10 +185,27 @@ async def health_check():
     
     return health_data
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe: 200 once every non-lazy model is loaded and warmed up"""
+    readiness = model_manager.readiness()
+    readiness["timestamp"] = time.time()
+    return JSONResponse(content=readiness, status_code=200 if readiness["ready"] else 503)
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics for this worker process"""
+    if not settings.metrics_enabled:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return Response(content=registry.render(), media_type=registry.CONTENT_TYPE)
+
 @app.post("/predict-damage")
 async def predict_damage(
+    request: Request,
     file: UploadFile = File(...),
-    include_probabilities: Optional[bool] = Query(False, description="Include all class probabilities in response")
+    include_probabilities: Optional[bool] = Query(False, description="Include all class probabilities in response"),
+    tier: Optional[str] = Query(None, pattern="^(fast|accurate)$", description="Quality tier: 'fast' (quantized) or 'accurate'; defaults to DEFAULT_TIER"),
+    input_format: Optional[str] = Query("image", pattern=INPUT_FORMAT_PATTERN, description=INPUT_FORMAT_DESCRIPTION)
 ):
     """
     Predict car damage severity from uploaded image
@@ -81,42 +213,49 @@ async def predict_damage(
     Args:
         file: Image file (JPG, PNG, WEBP)
         include_probabilities: Include all class probabilities in response
+        tier: 'fast' for the quantized model when available, 'accurate' for full precision
+        input_format: 'image' for an encoded image, 'tensor' for pixels letterboxed on the device
     
     Returns:
-        JSON response with damage classification and confidence
+        JSON or msgpack response (by Accept header) with damage classification and confidence
     """
     try:
-        # Validate file
-        await validate_image_file(file)
-        
-        # Read file content
-        file_content = await file.read()
+        # Read and validate the upload in a single pass
+        file_content = await read_input(file, input_format, ["classification"])
         
         # Make prediction
-        prediction_result = model_manager.predict_damage(file_content)
+        async with admission_controller.admit(image_pixels(file_content)):
+            prediction_result = await inference_executor.run(model_manager.predict_damage, file_content, tier=tier)
+        check_deadline("formatting")
         
         # Format response based on user preference
         response = format_response(prediction_result, include_probabilities)
+        response["metadata"]["tier"] = served_tier(["classification"], tier)
         
-        logger.info(f"Damage prediction completed: {prediction_result['class']} "
-                   f"({prediction_result['confidence']:.2%})")
+        annotate_request(damage_class=prediction_result["class"], confidence=prediction_result["confidence"])
         
-        return JSONResponse(content=response)
+        return encoded_response(request, response)
+    
+    except HTTPException:
+        raise
     
     except ValueError as e:
-        logger.error(f"Model error: {e}")
+        logger.error("Model error: %s", e)
         error_response = create_error_response(str(e), "MODEL_ERROR")
         return JSONResponse(content=error_response, status_code=503)
     
     except Exception as e:
-        logger.error(f"Prediction error: {e}")
+        logger.error("Prediction error: %s", e)
         error_response = create_error_response(str(e), "PREDICTION_ERROR")
         return JSONResponse(content=error_response, status_code=500)
 
 @app.post("/predict-location")
 async def predict_location(
+    request: Request,
     file: UploadFile = File(...),
-    include_probabilities: Optional[bool] = Query(False, description="Include all location probabilities in response")
+    include_probabilities: Optional[bool] = Query(False, description="Include all location probabilities in response"),
+    tier: Optional[str] = Query(None, pattern="^(fast|accurate)$", description="Quality tier: 'fast' (quantized) or 'accurate'; defaults to DEFAULT_TIER"),
+    input_format: Optional[str] = Query("image", pattern=INPUT_FORMAT_PATTERN, description=INPUT_FORMAT_DESCRIPTION)
 ):
     """
     Predict damage location from uploaded image
@@ -124,19 +263,20 @@ async def predict_location(
     Args:
         file: Image file (JPG, PNG, WEBP)
         include_probabilities: Include all location probabilities in response
+        tier: 'fast' for the quantized model when available, 'accurate' for full precision
+        input_format: 'image' for an encoded image, 'tensor' for pixels letterboxed on the device
     
     Returns:
-        JSON response with damage location and confidence
+        JSON or msgpack response (by Accept header) with damage location and confidence
     """
     try:
-        # Validate file
-        await validate_image_file(file)
-        
-        # Read file content
-        file_content = await file.read()
+        # Read and validate the upload in a single pass
+        file_content = await read_input(file, input_format, ["location"])
         
         # Make prediction
-        prediction_result = model_manager.predict_location(file_content)
+        async with admission_controller.admit(image_pixels(file_content)):
+            prediction_result = await inference_executor.run(model_manager.predict_location, file_content, tier=tier)
+        check_deadline("formatting")
         
         # Format response
         response = {
@@ -147,33 +287,39 @@ async def predict_location(
                 "confidence_percentage": f"{prediction_result['confidence']:.1%}"
             },
             "metadata": {
-                "model_version": "1.0.0",
-                "timestamp": time.time()
+                "model_version": prediction_result.get("model_version", settings.model_version),
+                "timestamp": time.time(),
+                "tier": served_tier(["location"], tier)
             }
         }
         
         if include_probabilities:
             response["data"]["all_probabilities"] = prediction_result.get("all_probabilities", {})
         
-        logger.info(f"Location prediction completed: {prediction_result['location']} "
-                   f"({prediction_result['confidence']:.2%})")
+        annotate_request(location=prediction_result["location"], confidence=prediction_result["confidence"])
         
-        return JSONResponse(content=response)
+        return encoded_response(request, response)
+    
+    except HTTPException:
+        raise
     
     except ValueError as e:
-        logger.error(f"Model error: {e}")
+        logger.error("Model error: %s", e)
         error_response = create_error_response(str(e), "MODEL_ERROR")
         return JSONResponse(content=error_response, status_code=503)
     
     except Exception as e:
-        logger.error(f"Location prediction error: {e}")
+        logger.error("Location prediction error: %s", e)
         error_response = create_error_response(str(e), "PREDICTION_ERROR")
         return JSONResponse(content=error_response, status_code=500)
 
 @app.post("/extract-features")
 async def extract_features(
+    request: Request,
     file: UploadFile = File(...),
-    include_raw_features: Optional[bool] = Query(False, description="Include raw feature vector in response")
+    include_raw_features: Optional[bool] = Query(False, description="Include raw feature vector in response"),
+    tier: Optional[str] = Query(None, pattern="^(fast|accurate)$", description="Quality tier: 'fast' (quantized) or 'accurate'; defaults to DEFAULT_TIER"),
+    input_format: Optional[str] = Query("image", pattern=INPUT_FORMAT_PATTERN, description=INPUT_FORMAT_DESCRIPTION)
 ):
     """
     Extract features from uploaded image
@@ -181,19 +327,21 @@ async def extract_features(
     Args:
         file: Image file (JPG, PNG, WEBP)
         include_raw_features: Include raw feature vector in response
+        tier: 'fast' for the quantized model when available, 'accurate' for full precision
+        input_format: 'image' for an encoded image, 'tensor' for pixels letterboxed on the device
     
     Returns:
-        JSON response with extracted features
+        Response with extracted features: JSON, msgpack or the raw float32/float16
+        vector, chosen by the Accept header
     """
     try:
-        # Validate file
-        await validate_image_file(file)
-        
-        # Read file content
-        file_content = await file.read()
+        # Read and validate the upload in a single pass
+        file_content = await read_input(file, input_format, ["features"])
         
         # Extract features
-        feature_result = model_manager.extract_features(file_content)
+        async with admission_controller.admit(image_pixels(file_content)):
+            feature_result = await inference_executor.run(model_manager.extract_features, file_content, tier=tier)
+        check_deadline("formatting")
         
         # Format response
         response = {
@@ -203,33 +351,100 @@ async def extract_features(
                 "extracted": True
             },
             "metadata": {
-                "model_version": "1.0.0",
-                "timestamp": time.time()
+                "model_version": feature_result.get("model_version", settings.model_version),
+                "timestamp": time.time(),
+                "tier": served_tier(["features"], tier)
             }
         }
         
         if include_raw_features:
             response["data"]["raw_features"] = feature_result["features"]
         
-        logger.info(f"Feature extraction completed: {feature_result['feature_count']} features extracted")
+        annotate_request(feature_count=feature_result["feature_count"])
         
-        return JSONResponse(content=response)
+        return encoded_response(request, response, vector=feature_result["features"])
+    
+    except HTTPException:
+        raise
     
     except ValueError as e:
-        logger.error(f"Model error: {e}")
+        logger.error("Model error: %s", e)
         error_response = create_error_response(str(e), "MODEL_ERROR")
         return JSONResponse(content=error_response, status_code=503)
     
     except Exception as e:
-        logger.error(f"Feature extraction error: {e}")
+        logger.error("Feature extraction error: %s", e)
         error_response = create_error_response(str(e), "EXTRACTION_ERROR")
         return JSONResponse(content=error_response, status_code=500)
 
+@app.post("/similar-images")
+async def similar_images(
+    request: Request,
+    file: UploadFile = File(...),
+    k: int = Query(5, ge=1, le=100, description="Number of similar images to return"),
+    approximate: Optional[bool] = Query(False, description="Use approximate search for large collections"),
+    input_format: Optional[str] = Query("image", pattern=INPUT_FORMAT_PATTERN, description=INPUT_FORMAT_DESCRIPTION)
+):
+    """
+    Find previously seen images with similar feature vectors
+    
+    Args:
+        file: Image file (JPG, PNG, WEBP)
+        k: Number of similar images to return
+        approximate: Use approximate search for large collections
+        input_format: 'image' for an encoded image, 'tensor' for pixels letterboxed on the device
+    
+    Returns:
+        JSON or msgpack response (by Accept header) with the nearest images and their cosine similarity
+    """
+    try:
+        # Read and validate the upload in a single pass
+        file_content = await read_input(file, input_format, ["features"])
+        
+        # Search the feature index
+        async with admission_controller.admit(image_pixels(file_content)):
+            search_result = await inference_executor.run(model_manager.find_similar, file_content, k, approximate)
+        check_deadline("formatting")
+        
+        response = {
+            "success": True,
+            "data": {
+                "image_id": search_result["image_id"],
+                "matches": search_result["matches"],
+                "indexed_images": search_result["indexed_images"],
+                "approximate": approximate
+            },
+            "metadata": {
+                "model_version": search_result.get("model_version", settings.model_version),
+                "timestamp": time.time()
+            }
+        }
+        
+        annotate_request(matches=len(search_result["matches"]), indexed_images=search_result["indexed_images"])
+        
+        return encoded_response(request, response)
+    
+    except HTTPException:
+        raise
+    
+    except ValueError as e:
+        logger.error("Model error: %s", e)
+        error_response = create_error_response(str(e), "MODEL_ERROR")
+        return JSONResponse(content=error_response, status_code=503)
+    
+    except Exception as e:
+        logger.error("Similarity search error: %s", e)
+        error_response = create_error_response(str(e), "SIMILARITY_ERROR")
+        return JSONResponse(content=error_response, status_code=500)
+
 @app.post("/comprehensive-analysis")
 async def comprehensive_analysis(
+    request: Request,
     file: UploadFile = File(...),
     include_probabilities: Optional[bool] = Query(False, description="Include detailed probabilities and raw features"),
-    models: Optional[str] = Query("all", description="Comma-separated list of models to use: classification,location,features or 'all'")
+    models: Optional[str] = Query("all", description="Comma-separated list of models to use: classification,location,features or 'all'"),
+    tier: Optional[str] = Query(None, pattern="^(fast|accurate)$", description="Quality tier: 'fast' (quantized) or 'accurate'; defaults to DEFAULT_TIER"),
+    input_format: Optional[str] = Query("image", pattern=INPUT_FORMAT_PATTERN, description=INPUT_FORMAT_DESCRIPTION)
 ):
     """
     Perform comprehensive damage analysis using multiple models
@@ -238,65 +453,249 @@ async def comprehensive_analysis(
         file: Image file (JPG, PNG, WEBP)
         include_probabilities: Include detailed probabilities and features
         models: Which models to use (default: all)
+        tier: 'fast' for the quantized models when available, 'accurate' for full precision
+        input_format: 'image' for an encoded image, 'tensor' for pixels letterboxed on the device
     
     Returns:
-        JSON response with comprehensive analysis results
+        JSON or msgpack response (by Accept header) with comprehensive analysis results
     """
     try:
-        # Validate file
-        await validate_image_file(file)
-        
-        # Read file content
-        file_content = await file.read()
+        # Read and validate the upload in a single pass
+        file_content = await read_input(file, input_format, list(model_manager.model_configs))
         
         # Perform comprehensive analysis
-        analysis_result = model_manager.comprehensive_analysis(file_content)
+        async with admission_controller.admit(image_pixels(file_content)):
+            analysis_result = await inference_executor.run(model_manager.comprehensive_analysis, file_content, tier=tier)
+        check_deadline("formatting")
         
         # Filter results based on requested models
-        if models != "all":
-            requested_models = [m.strip() for m in models.split(",")]
-            filtered_result = {}
-            
-            for model in requested_models:
-                if model == "classification" and "damage_classification" in analysis_result:
-                    filtered_result["damage_classification"] = analysis_result["damage_classification"]
-                elif model == "location" and "damage_location" in analysis_result:
-                    filtered_result["damage_location"] = analysis_result["damage_location"]
-                elif model == "features" and "features" in analysis_result:
-                    filtered_result["features"] = analysis_result["features"]
-            
-            # Recalculate overall confidence for filtered results
-            if len(filtered_result) > 0:
-                confidences = []
-                if 'damage_classification' in filtered_result:
-                    confidences.append(filtered_result['damage_classification']['confidence'])
-                if 'damage_location' in filtered_result:
-                    confidences.append(filtered_result['damage_location']['confidence'])
-                if confidences:
-                    filtered_result['overall_confidence'] = float(np.mean(confidences))
-            
-            analysis_result = filtered_result
+        analysis_result = filter_analysis_result(analysis_result, models)
         
         # Format response
         response = format_comprehensive_response(analysis_result, include_probabilities)
+        response["metadata"]["tier"] = served_tier(model_manager.models, tier)
         
-        logger.info(f"Comprehensive analysis completed using {len(analysis_result)} models")
+        annotate_request(models=len(analysis_result))
         
-        return JSONResponse(content=response)
+        return encoded_response(request, response)
+    
+    except HTTPException:
+        raise
     
     except ValueError as e:
-        logger.error(f"Model error: {e}")
+        logger.error("Model error: %s", e)
         error_response = create_error_response(str(e), "MODEL_ERROR")
         return JSONResponse(content=error_response, status_code=503)
     
     except Exception as e:
-        logger.error(f"Comprehensive analysis error: {e}")
+        logger.error("Comprehensive analysis error: %s", e)
         error_response = create_error_response(str(e), "ANALYSIS_ERROR")
         return JSONResponse(content=error_response, status_code=500)
 
+@app.post("/batch-analysis")
+async def batch_analysis(
+    files: List[UploadFile] = File(...),
+    include_probabilities: Optional[bool] = Query(False, description="Include detailed probabilities and raw features"),
+    models: Optional[str] = Query("all", description="Comma-separated list of models to use: classification,location,features or 'all'"),
+    tier: Optional[str] = Query(None, pattern="^(fast|accurate)$", description="Quality tier: 'fast' (quantized) or 'accurate'; defaults to DEFAULT_TIER"),
+    input_format: Optional[str] = Query("image", pattern=INPUT_FORMAT_PATTERN, description=INPUT_FORMAT_DESCRIPTION)
+):
+    """
+    Analyze many images from one claim in a single request
+    
+    Args:
+        files: Image files (JPG, PNG, WEBP)
+        include_probabilities: Include detailed probabilities and features
+        models: Which models to use (default: all)
+        tier: 'fast' for the quantized models when available, 'accurate' for full precision
+        input_format: 'image' for encoded images, 'tensor' for pixels letterboxed on the device
+    
+    Returns:
+        NDJSON stream with one comprehensive analysis response per image, in completion order
+    """
+    if len(files) > settings.batch_max_images:
+        error_response = create_error_response(
+            f"Too many images. Maximum per request: {settings.batch_max_images}", "TOO_MANY_IMAGES"
+        )
+        return JSONResponse(content=error_response, status_code=400)
+    
+    # Shed the whole batch before reading any upload when the worker is already saturated
+    if settings.admission_enabled:
+        admission_controller.check()
+    
+    def image_line(index: int, response) -> bytes:
+        response.setdefault("metadata", {}).update({"index": index, "filename": files[index].filename})
+        return dumps_json(response) + b"\n"
+    
+    # Read every upload first; invalid ones get their error line straight away
+    error_lines = []
+    uploads = []
+    for index, file in enumerate(files):
+        try:
+            uploads.append((index, await read_input(file, input_format, list(model_manager.model_configs))))
+        except HTTPException as e:
+            error_lines.append(image_line(index, create_error_response(str(e.detail), "INVALID_IMAGE")))
+    
+    async def analyze_chunk(chunk):
+        try:
+            async with admission_controller.admit(sum(image_pixels(content) for _, content in chunk)):
+                return chunk, await inference_executor.run(
+                    model_manager.comprehensive_analysis_batch, [content for _, content in chunk], tier=tier
+                )
+        except Exception as e:
+            return chunk, [e] * len(chunk)
+    
+    annotate_request(images=len(files), invalid_images=len(error_lines))
+    
+    async def stream_results():
+        for line in error_lines:
+            yield line
+        
+        # Chunks of up to batch_max_size images become real batches in the models
+        chunk_size = max(1, settings.batch_max_size)
+        tasks = [
+            asyncio.ensure_future(analyze_chunk(uploads[start:start + chunk_size]))
+            for start in range(0, len(uploads), chunk_size)
+        ]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                chunk, chunk_results = await next_done
+                for (index, _), analysis_result in zip(chunk, chunk_results):
+                    if isinstance(analysis_result, (AdmissionRejected, DeadlineExceeded)):
+                        response = create_error_response(analysis_result.detail, analysis_result.code)
+                    elif isinstance(analysis_result, ValueError):
+                        response = create_error_response(str(analysis_result), "MODEL_ERROR")
+                    elif isinstance(analysis_result, Exception):
+                        response = create_error_response(str(analysis_result), "ANALYSIS_ERROR")
+                    else:
+                        analysis_result = filter_analysis_result(analysis_result, models)
+                        response = format_comprehensive_response(analysis_result, include_probabilities)
+                        response["metadata"]["tier"] = served_tier(model_manager.models, tier)
+                    yield image_line(index, response)
+        finally:
+            for task in tasks:
+                task.cancel()
+    
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+@app.post("/jobs/comprehensive-analysis", status_code=202)
+async def submit_analysis_job(
+    request: Request,
+    file: UploadFile = File(...),
+    include_probabilities: Optional[bool] = Query(False, description="Include detailed probabilities and raw features"),
+    models: Optional[str] = Query("all", description="Comma-separated list of models to use: classification,location,features or 'all'"),
+    tier: Optional[str] = Query(None, pattern="^(fast|accurate)$", description="Quality tier: 'fast' (quantized) or 'accurate'; defaults to DEFAULT_TIER"),
+    input_format: Optional[str] = Query("image", pattern=INPUT_FORMAT_PATTERN, description=INPUT_FORMAT_DESCRIPTION)
+):
+    """
+    Queue a comprehensive analysis and return straight away with a job ID
+    
+    Args:
+        file: Image file (JPG, PNG, WEBP)
+        include_probabilities: Include detailed probabilities and features
+        models: Which models to use (default: all)
+        tier: 'fast' for the quantized models when available, 'accurate' for full precision
+        input_format: 'image' for an encoded image, 'tensor' for pixels letterboxed on the device
+    
+    Returns:
+        202 response with the job ID; poll GET /jobs/{job_id} for the result
+    """
+    if not settings.jobs_enabled:
+        raise HTTPException(status_code=404, detail="Async jobs are disabled")
+    if not job_runner.running:
+        # No inference backend, so nothing in this process would ever run the job
+        error_response = create_error_response("Async jobs are unavailable: no inference backend", "MODEL_ERROR")
+        return JSONResponse(content=error_response, status_code=503)
+    
+    try:
+        # Read and validate the upload in a single pass
+        file_content = await read_input(file, input_format, list(model_manager.model_configs))
+        
+        queued = await run_in_threadpool(job_store.queued_count)
+        if queued >= settings.jobs_max_queued:
+            # Roughly when the backlog drains, from the recent per-job inference time
+            backlog = queued * (inference_executor.service_seconds or 1.0) / job_runner.workers
+            raise AdmissionRejected(429, "JOB_QUEUE_FULL", f"Too many queued jobs ({queued}). Please retry later",
+                                    retry_after=max(1, math.ceil(backlog)))
+        
+        job = await run_in_threadpool(
+            job_store.submit,
+            "comprehensive-analysis",
+            {
+                "include_probabilities": bool(include_probabilities),
+                "models": models,
+                "tier": tier,
+                "tensor_shape": list(file_content.shape) if isinstance(file_content, LetterboxedTensor) else None
+            },
+            file_content
+        )
+        job_runner.notify()
+        annotate_request(job_id=job["job_id"])
+        
+        response = {
+            "success": True,
+            "data": {**job, "poll_url": f"/jobs/{job['job_id']}"},
+            "metadata": {
+                "result_ttl_seconds": settings.jobs_result_ttl_seconds,
+                "timestamp": time.time()
+            }
+        }
+        return encoded_response(request, response, status_code=202)
+    
+    except HTTPException:
+        raise
+    
+    except Exception as e:
+        logger.error("Job submission error: %s", e)
+        error_response = create_error_response(str(e), "JOB_ERROR")
+        return JSONResponse(content=error_response, status_code=500)
+
+@app.get("/jobs/{job_id}")
+async def get_job(request: Request, job_id: str):
+    """
+    Poll an async job
+    
+    Args:
+        job_id: ID returned when the job was submitted
+    
+    Returns:
+        Job status; finished jobs carry the analysis response as "result" or an
+        "error", until their result TTL passes
+    """
+    if not settings.jobs_enabled:
+        raise HTTPException(status_code=404, detail="Async jobs are disabled")
+    
+    job = await run_in_threadpool(job_store.get, job_id)
+    if job is None:
+        error_response = create_error_response("Job not found or its result has expired", "JOB_NOT_FOUND")
+        return JSONResponse(content=error_response, status_code=404)
+    
+    response = {
+        "success": True,
+        "data": job,
+        "metadata": {
+            "timestamp": time.time()
+        }
+    }
+    return encoded_response(request, response)
+
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected_handler(request, exc):
+    """Shed load with the standard error body and a Retry-After header"""
+    error_response = create_error_response(exc.detail, exc.code)
+    error_response["error"]["retry_after"] = exc.retry_after
+    return JSONResponse(content=error_response, status_code=exc.status_code, headers=exc.headers)
+
+@app.exception_handler(DeadlineExceeded)
+async def deadline_exceeded_handler(request, exc):
+    """Report work dropped because the deadline passed or the client disconnected"""
+    error_response = create_error_response(exc.detail, exc.code)
+    return JSONResponse(content=error_response, status_code=exc.status_code)
+
 @app.exception_handler(413)
 async def file_too_large_handler(request, exc):
     """Handle file size too large errors"""
+    record_error("FILE_TOO_LARGE")
     return JSONResponse(
         status_code=413,
         content={
@@ -313,6 +712,7 @@ async def file_too_large_handler(request, exc):
 @app.exception_handler(400)
 async def bad_request_handler(request, exc):
     """Handle bad request errors"""
+    record_error("BAD_REQUEST")
     return JSONResponse(
         status_code=400,
         content={
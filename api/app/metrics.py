@@ -0,0 +1,239 @@
+import bisect
+import contextvars
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from .logging_config import annotate_request
+
+# Latency buckets in seconds, fine-grained at the low end where per-stage timings sit
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(labelnames: Tuple[str, ...], labelvalues: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, labelvalues)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class _Metric:
+    """Base for a named metric with a fixed set of label names"""
+
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        self._function: Optional[Callable] = None
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def set_function(self, function: Callable):
+        """Read the value at scrape time: a number, or {label value tuple: number}"""
+        self._function = function
+
+    def _simple_samples(self):
+        if self._function is not None:
+            value = self._function()
+            values = value.items() if isinstance(value, dict) else [((), value)]
+        else:
+            with self._lock:
+                values = list(self._values.items())
+        for key, value in values:
+            key = key if isinstance(key, tuple) else (key,)
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+    def render(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.kind}"
+        yield from self._samples()
+
+class Counter(_Metric):
+    """Monotonically increasing count per label set, or read from a callback at scrape time"""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _samples(self):
+        return self._simple_samples()
+
+class Gauge(_Metric):
+    """Value that goes up and down, or is read from a callback at scrape time"""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def _samples(self):
+        return self._simple_samples()
+
+class Histogram(_Metric):
+    """Bucketed distribution of observed values per label set"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall time spent inside the block"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _samples(self):
+        with self._lock:
+            values = [(key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items()]
+        for key, (counts, total, count) in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {count}"
+
+class MetricsRegistry:
+    """Collects metrics and renders them in the Prometheus text format"""
+
+    CONTENT_TYPE = "text/plain; version=0.0.4"  # Starlette appends the charset
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+registry = MetricsRegistry()
+
+REQUEST_DURATION = registry.register(Histogram(
+    "http_request_duration_seconds", "End-to-end request latency", ("endpoint",)
+))
+REQUESTS = registry.register(Counter(
+    "http_requests_total", "Requests by endpoint, HTTP status and API error code", ("endpoint", "status", "code")
+))
+ERRORS = registry.register(Counter(
+    "api_errors_total", "Error responses by API error code, including per-image batch errors", ("code",)
+))
+IN_FLIGHT = registry.register(Gauge(
+    "http_requests_in_flight", "Requests currently being handled"
+))
+STAGE_DURATION = registry.register(Histogram(
+    "stage_duration_seconds", "Time per request processing stage", ("stage",)
+))
+INFERENCE_DURATION = registry.register(Histogram(
+    "model_inference_duration_seconds", "Forward pass time per batch", ("model", "tier")
+))
+INFERENCE_BATCH_SIZE = registry.register(Histogram(
+    "model_batch_size", "Images per forward pass", ("model",), buckets=(1, 2, 4, 8, 16, 32, 64, 128)
+))
+QUEUE_DEPTH = registry.register(Gauge(
+    "inference_queue_depth", "Work waiting for the inference executor or a model's batcher", ("queue",)
+))
+MODELS_LOADED = registry.register(Gauge(
+    "models_loaded", "Models loaded and ready to serve"
+))
+MODEL_RELOADS = registry.register(Counter(
+    "model_reloads_total", "Hot model reloads by result", ("model", "result")
+))
+RESULT_CACHE_LOOKUPS = registry.register(Counter(
+    "result_cache_lookups_total", "Result cache lookups by outcome", ("result",)
+))
+RESULT_CACHE_SIZE = registry.register(Gauge(
+    "result_cache_size", "In-memory result cache occupancy", ("unit",)
+))
+
+# Holder the metrics middleware shares with create_error_response for the current request
+_request_state: contextvars.ContextVar = contextvars.ContextVar("request_metrics_state", default=None)
+
+def record_error(code: str):
+    """Count an API error code and attach it to the current request's counter and log line"""
+    ERRORS.inc(code=code)
+    annotate_request(error_code=code)
+    state = _request_state.get()
+    if state is not None and "code" not in state:
+        state["code"] = code
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, status and error code for every HTTP request"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        state = {}
+        response_status = [500]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                response_status[0] = message["status"]
+            await send(message)
+
+        token = _request_state.set(state)
+        IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            IN_FLIGHT.dec()
+            # Route templates, not raw paths, so IDs in URLs and unknown URLs cannot explode cardinality
+            route = scope.get("route")
+            endpoint = getattr(route, "path", None) or "unmatched"
+            REQUEST_DURATION.observe(time.perf_counter() - started, endpoint=endpoint)
+            REQUESTS.inc(endpoint=endpoint, status=str(response_status[0]), code=state.get("code", ""))
+            _request_state.reset(token)
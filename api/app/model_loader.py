@@ -1,24 +1,73 @@
-try:
-    import tensorflow as tf
-    TENSORFLOW_AVAILABLE = True
-except ImportError as e:
-    print(f"Warning: TensorFlow not available - {e}")
-    TENSORFLOW_AVAILABLE = False
-    tf = None
+from .backends import TENSORFLOW_AVAILABLE, BACKENDS, TFLiteBackend, create_backend, import_tensorflow
+
+# TensorFlow is imported on first model load so the app can serve before it is ready
+tf = None
 
 import numpy as np
-from PIL import Image
-import io
 import logging
+import threading
 from pathlib import Path
+from typing import Optional
+from contextlib import contextmanager
 from .config import settings
+from .preprocessing import BufferPool, preprocess_for_sizes, preprocess_into, tensor_shape
+from .batching import MicroBatcher
+from .cache import ResultCache
+from .similarity import FeatureIndex
+from .metrics import INFERENCE_BATCH_SIZE, INFERENCE_DURATION, MODEL_RELOADS
+from .deadline import check_deadline
+from .artifacts import file_sha256, passes_gate, quantized_path, read_report
 
 logger = logging.getLogger(__name__)
 
+# Settings attribute holding each model's file name, and its display name
+MODEL_FILES = {
+    'classification': ('classification_model', 'Classification'),
+    'location': ('location_model', 'Location'),
+    'features': ('feature_model', 'Feature extraction')
+}
+
+# Key under which each head's result appears in a comprehensive analysis
+HEAD_RESULT_KEYS = {
+    'classification': 'damage_classification',
+    'location': 'damage_location',
+    'features': 'features'
+}
+
 class ModelManager:
     def __init__(self):
         self.models = {}
+        self.batchers = {}
+        self.fast_models = {}  # Quantized variants serving the fast tier
+        self.fast_batchers = {}
+        self.buffer_pool = BufferPool(settings.buffer_pool_size)  # Batch assembly, and inputs on the fast path
+        self.result_cache = ResultCache(
+            max_entries=settings.result_cache_max_entries,
+            max_bytes=settings.result_cache_max_bytes,
+            ttl_seconds=settings.result_cache_ttl_seconds,
+            disk_dir=settings.result_cache_dir,
+            disk_max_bytes=settings.result_cache_disk_max_bytes
+        ) if settings.result_cache_enabled else None
+        self.feature_index = FeatureIndex(
+            settings.feature_index_dir,
+            dtype=settings.feature_index_dtype,
+            code_bits=settings.feature_index_code_bits,
+            approximate_candidates=settings.feature_index_candidates,
+            flush_rows=settings.feature_index_flush_rows,
+            flush_interval_seconds=settings.feature_index_flush_interval_seconds
+        ) if settings.feature_index_enabled else None
         self.tensorflow_available = TENSORFLOW_AVAILABLE
+        self.inference_available = any(self._backend_available(name) for name in MODEL_FILES)
+        
+        # Per-model load state: pending, loading, ready, missing or failed
+        self.model_status = {name: 'pending' for name in MODEL_FILES}
+        self.model_errors = {}
+        self._load_locks = {name: threading.Lock() for name in MODEL_FILES}
+        self._threads_configured = False
+        self._loader_thread = None
+        self._file_signatures = {}  # (mtime, size) of each model file when last loaded or checked
+        self._watcher_thread = None
+        self._stop_watching = threading.Event()
         
         # Model-specific configurations
         self.model_configs = {
@@ -41,248 +90,841 @@ class ModelManager:
             'damage_location': self.model_configs['location']['class_names']
         }
         
-        if self.tensorflow_available:
-            self.load_models()
-        else:
-            logger.warning("TensorFlow not available - ML models will not be loaded")
+        if not self.inference_available:
+            logger.warning("No inference backend available - ML models will not be loaded")
+    
+    def confirm_tensorflow(self) -> bool:
+        """Import TensorFlow on first use and update the availability flags from the result"""
+        global tf
+        try:
+            tf = import_tensorflow()
+        except ImportError as e:
+            if self.tensorflow_available:
+                logger.error("%s", e)
+        self.tensorflow_available = TFLiteBackend.available()
+        self.inference_available = any(self._backend_available(name) for name in MODEL_FILES)
+        return tf is not None
+    
+    def configure_threads(self):
+        """Apply per-process TensorFlow thread pool sizes before the runtime starts"""
+        if self._threads_configured:
+            return
+        self._threads_configured = True
+        try:
+            if settings.tf_intra_op_threads > 0:
+                tf.config.threading.set_intra_op_parallelism_threads(settings.tf_intra_op_threads)
+            if settings.tf_inter_op_threads > 0:
+                tf.config.threading.set_inter_op_parallelism_threads(settings.tf_inter_op_threads)
+        except RuntimeError as e:
+            # Raised once the TensorFlow context has already been initialized
+            logger.warning("Could not configure TensorFlow threads: %s", e)
+    
+    def backend_name(self, model_name: str) -> str:
+        """Inference backend configured for a model"""
+        return settings.model_backends.get(model_name, settings.inference_backend)
+    
+    def _backend_available(self, model_name: str) -> bool:
+        backend_class = BACKENDS.get(self.backend_name(model_name))
+        return backend_class is not None and backend_class.available()
+    
+    def _create_backend(self, backend_name: str):
+        return create_backend(
+            backend_name,
+            num_threads=settings.backend_num_threads or settings.tf_intra_op_threads,
+            artifact_dir=settings.artifact_dir,
+            compiled=settings.compiled_inference,
+            xla_jit=settings.xla_jit
+        )
     
     def load_models(self):
         """Load all ML models into memory"""
-        try:
-            model_dir = Path(settings.model_dir)
-            
-            # Load classification model
-            classification_path = model_dir / settings.classification_model
-            if classification_path.exists():
-                self.models['classification'] = tf.keras.models.load_model(
-                    str(classification_path)
-                )
-                # Auto-detect input size for classification model
-                input_shape = self.models['classification'].input_shape
-                self.model_configs['classification']['input_size'] = (input_shape[1], input_shape[2])
-                logger.info(f"Classification model loaded - Input size: {self.model_configs['classification']['input_size']}")
-            else:
-                logger.warning(f"Classification model not found: {classification_path}")
+        for model_name in MODEL_FILES:
+            self.load_model(model_name)
+        
+        logger.info(f"Successfully loaded {len(self.models)} models")
+    
+    def load_model(self, model_name: str):
+        """Load, compile and warm up one model, then publish it for requests"""
+        self._check_inference_available("model loading")
+        
+        with self._load_locks[model_name]:
+            if model_name in self.models:
+                return self.models[model_name]
             
-            # Load location model
-            location_path = model_dir / settings.location_model
-            if location_path.exists():
-                self.models['location'] = tf.keras.models.load_model(
-                    str(location_path)
-                )
-                # Auto-detect input size for location model
-                input_shape = self.models['location'].input_shape
-                self.model_configs['location']['input_size'] = (input_shape[1], input_shape[2])
-                logger.info(f"Location model loaded - Input size: {self.model_configs['location']['input_size']}")
-            else:
-                logger.warning(f"Location model not found: {location_path}")
+            setting_name, label = MODEL_FILES[model_name]
+            model_path = Path(settings.model_dir) / getattr(settings, setting_name)
+            if not model_path.exists():
+                logger.warning(f"{label} model not found: {model_path}")
+                self.model_status[model_name] = 'missing'
+                return None
             
-            # Load feature extraction model
-            feature_path = model_dir / settings.feature_model
-            if feature_path.exists():
-                self.models['features'] = tf.keras.models.load_model(
-                    str(feature_path)
-                )
-                # Auto-detect input size for features model
-                input_shape = self.models['features'].input_shape
-                self.model_configs['features']['input_size'] = (input_shape[1], input_shape[2])
-                logger.info(f"Features model loaded - Input size: {self.model_configs['features']['input_size']}")
-            else:
-                logger.warning(f"Feature model not found: {feature_path}")
+            self.model_status[model_name] = 'loading'
+            try:
+                model, fast_model = self._load_version(model_name, model_path, settings.warmup_on_startup)
                 
-            logger.info(f"Successfully loaded {len(self.models)} models")
+                # Auto-detect input size for the model
+                self.model_configs[model_name]['input_size'] = self._input_size(model)
+                logger.info(f"{label} model {model.version} loaded with {model.name} backend - "
+                            f"Input size: {self.model_configs[model_name]['input_size']}")
+                
+                # Publishing last means requests never see a half-initialized model
+                self._publish(model_name, model, fast_model)
+                self.model_status[model_name] = 'ready'
+                return model
+            
+            except Exception as e:
+                logger.error(f"Error loading {model_name} model: {e}")
+                self.model_status[model_name] = 'failed'
+                self.model_errors[model_name] = str(e)
+                raise
+    
+    def reload_model(self, model_name: str) -> bool:
+        """Load the current file of a serving model next to the old version and swap it in once warm
+        
+        Returns False when the file content has not changed. The old version keeps
+        serving until the swap and is freed when its last in-flight batch finishes.
+        """
+        self._check_inference_available("model reload")
+        
+        with self._load_locks[model_name]:
+            current = self.models.get(model_name)
+            if current is None:
+                return False
+            
+            setting_name, label = MODEL_FILES[model_name]
+            model_path = Path(settings.model_dir) / getattr(settings, setting_name)
+            self._file_signatures[model_name] = self._file_signature(model_path)
+            if file_sha256(model_path) == current.digest:
+                return False
+            
+            try:
+                # Always warmed, so the swap causes no cold first batches
+                model, fast_model = self._load_version(model_name, model_path, warmup=True)
+                if self._input_size(model) != self.model_configs[model_name]['input_size']:
+                    raise ValueError(f"input size changed from {self.model_configs[model_name]['input_size']} "
+                                     f"to {self._input_size(model)}; restart the API to roll it out")
+            except Exception as e:
+                MODEL_RELOADS.inc(model=model_name, result="failed")
+                logger.error(f"Could not reload {model_name} model, {current.version} keeps serving: {e}")
+                raise
+            
+            self._publish(model_name, model, fast_model)
+            MODEL_RELOADS.inc(model=model_name, result="swapped")
+            logger.info(f"{label} model swapped from {current.version} to {model.version}")
+            return True
+    
+    def _load_version(self, model_name: str, model_path: Path, warmup: bool):
+        """Load, version and warm up one model file and its fast variant without publishing them"""
+        signature = self._file_signature(model_path)
+        digest = file_sha256(model_path)
+        
+        model = self._create_backend(self.backend_name(model_name))
+        if model.requires_tensorflow:
+            if not self.confirm_tensorflow():
+                raise RuntimeError(f"Cannot load {model_name} with the {model.name} backend: TensorFlow is unavailable")
+            self.configure_threads()
+        
+        model.load(model_path)
+        model.digest = digest
+        model.version = self._version_label(model_path, digest)
+        
+        if warmup:
+            self._warmup_model(model_name, model)
+        
+        fast_model = self._load_fast_variant(model_name, model_path, digest, warmup)
+        if fast_model is not None:
+            fast_model.version = f"{model.version}-{settings.quantization_mode}"
+        
+        self._file_signatures[model_name] = signature
+        return model, fast_model
+    
+    def _publish(self, model_name: str, model, fast_model=None):
+        """Make a loaded version the one serving requests
+        
+        Batchers look the model up for every forward pass, so a swap lands
+        between batches and queued requests run on the new version.
+        """
+        if settings.batching_enabled and model_name not in self.batchers:
+            self.batchers[model_name] = MicroBatcher(
+                model_name,
+                lambda batch, model_name=model_name: self._forward(model_name, batch),
+                max_batch_size=settings.batch_max_size,
+                max_wait_ms=settings.batch_max_wait_ms,
+                buffer_pool=self.buffer_pool
+            )
+        if fast_model is not None and settings.batching_enabled and model_name not in self.fast_batchers:
+            self.fast_batchers[model_name] = MicroBatcher(
+                f"{model_name}-fast",
+                lambda batch, model_name=model_name: self._forward(model_name, batch, 'fast'),
+                max_batch_size=settings.batch_max_size,
+                max_wait_ms=settings.batch_max_wait_ms,
+                buffer_pool=self.buffer_pool
+            )
+        
+        if fast_model is not None:
+            self.fast_models[model_name] = fast_model
+        else:
+            self.fast_models.pop(model_name, None)
+        self.models[model_name] = model
+    
+    @staticmethod
+    def _input_size(model):
+        input_shape = model.input_shape
+        return (input_shape[1], input_shape[2])
+    
+    @staticmethod
+    def _file_signature(model_path: Path):
+        stat = model_path.stat()
+        return (stat.st_mtime_ns, stat.st_size)
+    
+    @staticmethod
+    def _version_label(model_path: Path, digest: str) -> str:
+        """A <model file>.version label shipped with the model, else MODEL_VERSION plus the content hash"""
+        label_path = model_path.with_name(model_path.name + ".version")
+        if label_path.exists():
+            label = label_path.read_text().strip()
+            if label:
+                return label
+        return f"{settings.model_version}+{digest[:12]}"
+    
+    def _load_fast_variant(self, model_name: str, model_path: Path, digest: str, warmup: bool):
+        """Load the quantized variant for the fast tier if it passed its accuracy gate"""
+        try:
+            artifact = quantized_path(model_path, settings.quantization_mode, digest, settings.artifact_dir)
+            report = read_report(artifact)
+            if report is None or not TFLiteBackend.available():
+                return None
+            if not passes_gate(report['metrics'], settings.quantization_min_agreement,
+                               settings.quantization_max_drift, settings.quantization_min_feature_similarity):
+                logger.warning(f"{model_name} {settings.quantization_mode} variant fails the accuracy gate, "
+                               f"fast tier disabled: {report['metrics']}")
+                return None
             
+            runner = self._create_backend('tflite')
+            runner.load(artifact)
+            if warmup:
+                runner.warmup([1])
+            logger.info(f"Fast tier for {model_name} uses {artifact.name}")
+            return runner
+        
         except Exception as e:
-            logger.error(f"Error loading models: {e}")
-            raise
+            # The accurate tier still serves, so a broken variant only costs speed
+            logger.warning(f"Could not load fast variant of {model_name} model: {e}")
+            return None
+    
+    def serving_tier(self, model_name: str, tier: Optional[str] = None) -> str:
+        """Tier that actually serves a head: fast only when its quantized variant is loaded"""
+        tier = tier or settings.default_tier
+        return 'fast' if tier == 'fast' and model_name in self.fast_models else 'accurate'
+    
+    def start_background_loading(self):
+        """Load and warm every non-lazy model in a background thread"""
+        def load_all():
+            # A broken TensorFlow install is found here rather than reported as available
+            if any(BACKENDS[self.backend_name(name)].requires_tensorflow for name in MODEL_FILES
+                   if self.backend_name(name) in BACKENDS):
+                self.confirm_tensorflow()
+            if not self.inference_available:
+                logger.warning("No inference backend available - ML models will not be loaded")
+                return
+            for model_name in MODEL_FILES:
+                if model_name in settings.lazy_models:
+                    continue
+                try:
+                    self.load_model(model_name)
+                except Exception:
+                    pass  # Recorded in model_status and logged by load_model
+            logger.info(f"Background loading finished - {len(self.models)} models ready")
+        
+        self._loader_thread = threading.Thread(target=load_all, name="model-loader", daemon=True)
+        self._loader_thread.start()
+        return self._loader_thread
+    
+    def start_reload_watcher(self):
+        """Poll the model files and hot-swap any model whose file was replaced"""
+        if settings.model_reload_interval_seconds <= 0:
+            return None
+        
+        def watch():
+            while not self._stop_watching.wait(settings.model_reload_interval_seconds):
+                self.check_for_updates()
+        
+        self._stop_watching.clear()
+        self._watcher_thread = threading.Thread(target=watch, name="model-reload-watcher", daemon=True)
+        self._watcher_thread.start()
+        return self._watcher_thread
+    
+    def check_for_updates(self):
+        """Reload every serving model whose file changed since it was loaded"""
+        for model_name, (setting_name, _) in MODEL_FILES.items():
+            if model_name not in self.models:
+                continue
+            model_path = Path(settings.model_dir) / getattr(settings, setting_name)
+            try:
+                if self._file_signature(model_path) == self._file_signatures.get(model_name):
+                    continue
+                self.reload_model(model_name)
+            except FileNotFoundError:
+                continue  # Mid-rename; the next poll sees the new file
+            except Exception:
+                pass  # Logged by reload_model; retried when the file changes again
+    
+    def ensure_model(self, model_name: str) -> bool:
+        """Check a model is ready, loading lazily configured models on first use"""
+        if model_name in self.models:
+            return True
+        if (model_name in settings.lazy_models and self._backend_available(model_name)
+                and self.model_status[model_name] not in ('missing', 'failed')):
+            self.load_model(model_name)
+        return model_name in self.models
+    
+    def available_heads(self):
+        """Heads that can serve now, loading lazy ones on demand"""
+        return [name for name in ('classification', 'location', 'features') if self.ensure_model(name)]
+    
+    def tensor_shape(self, model_names):
+        """H x W x 3 shape a tensor upload must have to feed these heads, or None if their inputs differ"""
+        shapes = {tensor_shape(self.model_configs[name]['input_size']) for name in model_names}
+        return shapes.pop() if len(shapes) == 1 else None
+    
+    def tensor_input_spec(self):
+        """How clients preprocess on the device to skip server-side decode and resize"""
+        return {
+            "enabled": settings.tensor_input_enabled,
+            "dtype": "uint8",
+            "layout": "HWC",
+            "channels": "RGB",
+            "letterbox": "resize with aspect ratio preserved, centre on a black canvas of the input size",
+            "shapes": {name: list(tensor_shape(config['input_size'])) for name, config in self.model_configs.items()}
+        }
+    
+    def readiness(self):
+        """Per-model load state and whether every eagerly loaded model is usable"""
+        eager = [name for name in MODEL_FILES if name not in settings.lazy_models]
+        settled = [name for name in eager if self.model_status[name] in ('ready', 'missing')]
+        
+        return {
+            "ready": self.inference_available and len(settled) == len(eager),
+            "progress": {
+                "loaded": len(settled),
+                "total": len(eager)
+            },
+            "models": {
+                name: {
+                    "status": self.model_status[name],
+                    "lazy": name in settings.lazy_models,
+                    "backend": self.backend_name(name),
+                    "fast_tier": name in self.fast_models,
+                    "version": self.models[name].version if name in self.models else None,
+                    **({"error": self.model_errors[name]} if name in self.model_errors else {})
+                }
+                for name in MODEL_FILES
+            }
+        }
+    
+    def _warmup_model(self, model_name: str, model):
+        batch_sizes = sorted(set(settings.warmup_batch_sizes + [settings.batch_max_size]))
+        model.warmup(batch_sizes)
+        logger.info(f"Warmed up {model_name} model for batch sizes {batch_sizes}")
+    
+    def _forward(self, model_name: str, batch, tier: str = 'accurate'):
+        """Run one forward pass over a batch of preprocessed images"""
+        # Looked up per batch, so a reload swaps versions between batches
+        model = self.fast_models.get(model_name) if tier == 'fast' else None
+        if model is None:
+            model = self.models[model_name]
+        INFERENCE_BATCH_SIZE.observe(len(batch), model=model_name)
+        with INFERENCE_DURATION.time(model=model_name, tier=tier):
+            return model.run(batch)
     
-    def _check_tensorflow_available(self, operation_name: str):
-        """Check if TensorFlow is available for the operation"""
-        if not self.tensorflow_available:
-            raise RuntimeError(f"Cannot perform {operation_name}: TensorFlow not available. "
+    def run_model(self, model_name: str, processed_image, tier: Optional[str] = None):
+        """Run a model, batching with concurrent callers when enabled"""
+        check_deadline(f"the {model_name} model")
+        tier = self.serving_tier(model_name, tier)
+        batcher = (self.fast_batchers if tier == 'fast' else self.batchers).get(model_name)
+        if batcher is not None:
+            return batcher.predict(processed_image)
+        return self._forward(model_name, processed_image, tier)
+    
+    def _run_head(self, model_name: str, image_bytes: bytes, processed_image=None, tier: Optional[str] = None):
+        """Run one head on a shared input, or preprocess into a pooled buffer first"""
+        if processed_image is not None:
+            return self.run_model(model_name, processed_image, tier)[0]
+        with self.preprocessed(image_bytes, [model_name]) as processed:
+            return self.run_model(model_name, processed[model_name], tier)[0]
+    
+    def shutdown(self):
+        """Stop the reload watcher and background batching workers and write out buffered features"""
+        self._stop_watching.set()
+        for batcher in list(self.batchers.values()) + list(self.fast_batchers.values()):
+            batcher.shutdown()
+        if self.feature_index is not None:
+            self.feature_index.flush()
+    
+    def model_version(self, model_name: str, tier: Optional[str] = None) -> str:
+        """Version string of the model currently serving a head in a tier"""
+        models = self.fast_models if self.serving_tier(model_name, tier) == 'fast' else self.models
+        model = models.get(model_name)
+        return model.version if model is not None else settings.model_version
+    
+    def _content_hash(self, image_bytes: bytes) -> Optional[str]:
+        """Content hash shared by the result cache and the similarity index"""
+        if self.result_cache is None and self.feature_index is None:
+            return None
+        return ResultCache.content_hash(image_bytes)
+    
+    def _cache_key(self, model_name: str, content_hash: str, tier: Optional[str] = None,
+                   version: Optional[str] = None) -> str:
+        version = version or self.model_version(model_name, tier)
+        return self.result_cache.make_key(content_hash, model_name, version)
+    
+    def _cached_result(self, model_name: str, content_hash: Optional[str], tier: Optional[str] = None,
+                       count: bool = True):
+        """Return a cached result for a head without computing it
+        
+        Pass count=False for a pre-check whose head is looked up again through _cached,
+        so the lookup is not counted twice.
+        """
+        if self.result_cache is None or content_hash is None:
+            return None
+        key = self._cache_key(model_name, content_hash, tier)
+        return self.result_cache.get(key) if count else self.result_cache.peek(key)
+    
+    def _cached(self, model_name: str, image_bytes: bytes, content_hash: Optional[str], compute,
+                tier: Optional[str] = None):
+        """Serve a head's result from the cache, computing it once for concurrent callers"""
+        # Read the version once so the cache key and the reported version agree across a swap
+        version = self.model_version(model_name, tier)
+        
+        def compute_versioned():
+            result = compute()
+            result['model_version'] = version
+            return result
+        
+        if self.result_cache is None:
+            return compute_versioned()
+        if content_hash is None:
+            content_hash = ResultCache.content_hash(image_bytes)
+        return self.result_cache.get_or_compute(
+            self._cache_key(model_name, content_hash, tier, version), compute_versioned
+        )
+    
+    def _check_inference_available(self, operation_name: str):
+        """Check if an inference backend is available for the operation"""
+        if not self.inference_available:
+            raise RuntimeError(f"Cannot perform {operation_name}: no inference backend available. "
                              "This may be due to missing Visual C++ redistributables on Windows. "
-                             "Please install TensorFlow properly or use the API without ML features.")
+                             "Please install TensorFlow or ONNX Runtime properly or use the API without ML features.")
     
     def smart_preprocess_image(self, image_bytes: bytes, model_name: str):
         """Smart image preprocessing that adapts to each model's requirements"""
-        self._check_tensorflow_available("image preprocessing")
+        return self.preprocess_for_models(image_bytes, [model_name], use_pool=False)[model_name]
+    
+    @contextmanager
+    def preprocessed(self, image_bytes: bytes, model_names):
+        """Preprocess for several heads and hand pooled buffers back afterwards"""
+        if not model_names:
+            yield {}
+            return
         
-        if model_name not in self.model_configs:
-            raise ValueError(f"Unknown model: {model_name}")
+        processed = self.preprocess_for_models(image_bytes, model_names)
+        try:
+            yield processed
+        finally:
+            if settings.fast_preprocessing:
+                for buffer in {id(array): array for array in processed.values()}.values():
+                    self.buffer_pool.release(buffer)
+    
+    def preprocess_for_models(self, image_bytes: bytes, model_names, use_pool: bool = True):
+        """Decode the image once and share each distinct input size across models"""
+        self._check_inference_available("image preprocessing")
         
-        target_size = self.model_configs[model_name]['input_size']
+        for model_name in model_names:
+            if model_name not in self.model_configs:
+                raise ValueError(f"Unknown model: {model_name}")
         
         try:
-            # Load image
-            image = Image.open(io.BytesIO(image_bytes))
-            logger.info(f"Original image size: {image.size}, format: {image.format}")
-            
-            # Convert to RGB if necessary
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
-                logger.info(f"Converted image to RGB mode")
-            
-            # Smart resize with aspect ratio preservation and padding if needed
-            original_width, original_height = image.size
-            target_width, target_height = target_size
-            
-            # Calculate scaling factor to fit within target size while preserving aspect ratio
-            scale_w = target_width / original_width
-            scale_h = target_height / original_height
-            scale = min(scale_w, scale_h)
-            
-            # Resize with aspect ratio preserved
-            new_width = int(original_width * scale)
-            new_height = int(original_height * scale)
-            image = image.resize((new_width, new_height), Image.Resampling.LANCZOS)
-            
-            # Create a new image with target size and paste the resized image in the center
-            final_image = Image.new('RGB', target_size, (0, 0, 0))  # Black background
-            paste_x = (target_width - new_width) // 2
-            paste_y = (target_height - new_height) // 2
-            final_image.paste(image, (paste_x, paste_y))
-            
-            logger.info(f"Resized image to {target_size} for {model_name} model")
-            
-            # Convert to numpy array and normalize
-            image_array = np.array(final_image) / 255.0
-            image_array = np.expand_dims(image_array, axis=0)
-            
-            logger.info(f"Final image array shape: {image_array.shape}")
-            
-            return image_array
+            by_size = preprocess_for_sizes(
+                image_bytes,
+                [self.model_configs[name]['input_size'] for name in model_names],
+                fast=settings.fast_preprocessing,
+                pool=self.buffer_pool if use_pool and settings.fast_preprocessing else None
+            )
         
         except Exception as e:
-            logger.error(f"Error in smart preprocessing: {e}")
+            logger.error("Error in smart preprocessing: %s", e)
             raise
+        
+        # Drop an expired or abandoned request here rather than run its heads
+        check_deadline("model inference")
+        
+        return {
+            name: by_size[tuple(self.model_configs[name]['input_size'])]
+            for name in model_names
+        }
     
-    def predict_damage(self, image_bytes: bytes):
+    def predict_damage(self, image_bytes: bytes, processed_image=None, content_hash: Optional[str] = None,
+                       tier: Optional[str] = None):
         """Predict damage classification"""
-        self._check_tensorflow_available("damage prediction")
+        self._check_inference_available("damage prediction")
         
-        if 'classification' not in self.models:
+        if not self.ensure_model('classification'):
             raise ValueError("Classification model not loaded")
         
+        return self._cached(
+            'classification', image_bytes, content_hash,
+            lambda: self._predict_damage(image_bytes, processed_image, tier), tier
+        )
+    
+    def _predict_damage(self, image_bytes: bytes, processed_image=None, tier: Optional[str] = None):
+        """Run the classification head"""
         try:
-            # Preprocess image with model-specific size
-            processed_image = self.smart_preprocess_image(image_bytes, 'classification')
-            
             # Make prediction
-            prediction = self.models['classification'].predict(processed_image)[0]
-            
-            # Get class and confidence
-            predicted_class_idx = np.argmax(prediction)
-            confidence = float(np.max(prediction))
-            predicted_class = self.class_names['damage_severity'][predicted_class_idx]
-            
-            return {
-                'class': predicted_class,
-                'confidence': confidence,
-                'all_probabilities': {
-                    class_name: float(prob) 
-                    for class_name, prob in zip(
-                        self.class_names['damage_severity'], 
-                        prediction
-                    )
-                }
-            }
+            prediction = self._run_head('classification', image_bytes, processed_image, tier)
+            return self._damage_result(prediction)
         
         except Exception as e:
-            logger.error(f"Error during prediction: {e}")
+            logger.error("Error during prediction: %s", e)
             raise
     
-    def predict_location(self, image_bytes: bytes):
+    def _damage_result(self, prediction):
+        """Turn one row of classification output into a result dict"""
+        # Get class and confidence
+        predicted_class_idx = np.argmax(prediction)
+        confidence = float(np.max(prediction))
+        predicted_class = self.class_names['damage_severity'][predicted_class_idx]
+        
+        return {
+            'class': predicted_class,
+            'confidence': confidence,
+            'all_probabilities': {
+                class_name: float(prob) 
+                for class_name, prob in zip(
+                    self.class_names['damage_severity'], 
+                    prediction
+                )
+            }
+        }
+    
+    def predict_location(self, image_bytes: bytes, processed_image=None, content_hash: Optional[str] = None,
+                         tier: Optional[str] = None):
         """Predict damage location"""
-        self._check_tensorflow_available("location prediction")
+        self._check_inference_available("location prediction")
         
-        if 'location' not in self.models:
+        if not self.ensure_model('location'):
             raise ValueError("Location model not loaded")
         
+        return self._cached(
+            'location', image_bytes, content_hash,
+            lambda: self._predict_location(image_bytes, processed_image, tier), tier
+        )
+    
+    def _predict_location(self, image_bytes: bytes, processed_image=None, tier: Optional[str] = None):
+        """Run the location head"""
         try:
-            # Preprocess image with model-specific size
-            processed_image = self.smart_preprocess_image(image_bytes, 'location')
-            
             # Make prediction
-            prediction = self.models['location'].predict(processed_image)[0]
-            
-            # Get class and confidence
-            predicted_class_idx = np.argmax(prediction)
-            confidence = float(np.max(prediction))
-            predicted_class = self.class_names['damage_location'][predicted_class_idx]
-            
-            return {
-                'location': predicted_class,
-                'confidence': confidence,
-                'all_probabilities': {
-                    class_name: float(prob) 
-                    for class_name, prob in zip(
-                        self.class_names['damage_location'], 
-                        prediction
-                    )
-                }
-            }
+            prediction = self._run_head('location', image_bytes, processed_image, tier)
+            return self._location_result(prediction)
         
         except Exception as e:
-            logger.error(f"Error during location prediction: {e}")
+            logger.error("Error during location prediction: %s", e)
             raise
     
-    def extract_features(self, image_bytes: bytes):
+    def _location_result(self, prediction):
+        """Turn one row of location output into a result dict"""
+        # Get class and confidence
+        predicted_class_idx = np.argmax(prediction)
+        confidence = float(np.max(prediction))
+        predicted_class = self.class_names['damage_location'][predicted_class_idx]
+        
+        return {
+            'location': predicted_class,
+            'confidence': confidence,
+            'all_probabilities': {
+                class_name: float(prob) 
+                for class_name, prob in zip(
+                    self.class_names['damage_location'], 
+                    prediction
+                )
+            }
+        }
+    
+    def extract_features(self, image_bytes: bytes, processed_image=None, content_hash: Optional[str] = None,
+                         tier: Optional[str] = None):
         """Extract features using feature extraction model"""
-        self._check_tensorflow_available("feature extraction")
+        self._check_inference_available("feature extraction")
         
-        if 'features' not in self.models:
+        if not self.ensure_model('features'):
             raise ValueError("Feature extraction model not loaded")
         
+        if content_hash is None:
+            content_hash = self._content_hash(image_bytes)
+        
+        return self._cached(
+            'features', image_bytes, content_hash,
+            lambda: self._extract_features(image_bytes, processed_image, content_hash, tier), tier
+        )
+    
+    def _extract_features(self, image_bytes: bytes, processed_image=None, content_hash: Optional[str] = None,
+                          tier: Optional[str] = None):
+        """Run the feature extraction head"""
         try:
-            # Preprocess image with model-specific size
-            processed_image = self.smart_preprocess_image(image_bytes, 'features')
-            
             # Extract features
-            features = self.models['features'].predict(processed_image)[0]
-            
-            return {
-                'features': features.tolist(),
-                'feature_count': len(features)
-            }
+            features = self._run_head('features', image_bytes, processed_image, tier)
+            return self._features_result(features, self._index_hash('features', content_hash, tier))
         
         except Exception as e:
-            logger.error(f"Error during feature extraction: {e}")
+            logger.error("Error during feature extraction: %s", e)
             raise
     
-    def comprehensive_analysis(self, image_bytes: bytes):
+    def _index_hash(self, model_name: str, content_hash: Optional[str], tier: Optional[str]) -> Optional[str]:
+        """Content hash to index features under; quantized vectors are kept out of the index"""
+        return content_hash if self.serving_tier(model_name, tier) == 'accurate' else None
+    
+    def _features_result(self, features, content_hash: Optional[str] = None):
+        """Index one feature vector and turn it into a result dict"""
+        # Remember the vector for similarity search
+        if self.feature_index is not None and content_hash is not None:
+            try:
+                self.feature_index.add(content_hash, features)
+            except Exception as e:
+                logger.warning("Could not add features to similarity index: %s", e)
+        
+        return {
+            'features': features.tolist(),
+            'feature_count': len(features)
+        }
+    
+    def find_similar(self, image_bytes: bytes, k: int = 5, approximate: bool = False):
+        """Find the k most similar previously seen images by feature vector"""
+        self._check_inference_available("similarity search")
+        
+        if self.feature_index is None:
+            raise ValueError("Similarity index is disabled")
+        
+        content_hash = ResultCache.content_hash(image_bytes)
+        feature_result = self.extract_features(image_bytes, content_hash=content_hash, tier='accurate')
+        
+        # Ask for one extra match because the query image itself is indexed
+        matches = self.feature_index.search(feature_result['features'], k + 1, approximate)
+        matches = [match for match in matches if match['image_id'] != content_hash][:k]
+        
+        return {
+            'image_id': content_hash,
+            'matches': matches,
+            'indexed_images': len(self.feature_index),
+            'model_version': feature_result.get('model_version', settings.model_version)
+        }
+    
+    def comprehensive_analysis(self, image_bytes: bytes, tier: Optional[str] = None):
         """Perform comprehensive damage analysis using all models"""
-        self._check_tensorflow_available("comprehensive analysis")
+        self._check_inference_available("comprehensive analysis")
         
         results = {}
         
         try:
-            # Damage classification
-            if 'classification' in self.models:
-                results['damage_classification'] = self.predict_damage(image_bytes)
-            
-            # Damage location
-            if 'location' in self.models:
-                results['damage_location'] = self.predict_location(image_bytes)
-            
-            # Feature extraction
-            if 'features' in self.models:
-                results['features'] = self.extract_features(image_bytes)
+            # Decode once and letterbox once per distinct input size, skipping cached heads
+            content_hash = self._content_hash(image_bytes)
+            heads = self.available_heads()
+            if not heads:
+                raise ValueError("No models loaded")
+            missing = [name for name in heads if self._cached_result(name, content_hash, tier, count=False) is None]
+            with self.preprocessed(image_bytes, missing) as processed:
+                # Damage classification
+                if 'classification' in heads:
+                    results['damage_classification'] = self.predict_damage(
+                        image_bytes, processed.get('classification'), content_hash, tier
+                    )
+                
+                # Damage location
+                if 'location' in heads:
+                    results['damage_location'] = self.predict_location(
+                        image_bytes, processed.get('location'), content_hash, tier
+                    )
+                
+                # Feature extraction
+                if 'features' in heads:
+                    results['features'] = self.extract_features(
+                        image_bytes, processed.get('features'), content_hash, tier
+                    )
             
             # Calculate overall confidence score
-            confidences = []
-            if 'damage_classification' in results:
-                confidences.append(results['damage_classification']['confidence'])
-            if 'damage_location' in results:
-                confidences.append(results['damage_location']['confidence'])
-            
-            if confidences:
-                results['overall_confidence'] = float(np.mean(confidences))
+            self._add_overall_confidence(results)
             
             return results
         
         except Exception as e:
-            logger.error(f"Error during comprehensive analysis: {e}")
+            logger.error("Error during comprehensive analysis: %s", e)
             raise
+    
+    def comprehensive_analysis_batch(self, images, tier: Optional[str] = None):
+        """Analyze several images, running each head once over the whole batch
+        
+        Each image is letterboxed straight into its row of a pooled batch buffer
+        per input size. Returns one result dict or exception per image, in input order.
+        """
+        self._check_inference_available("comprehensive analysis")
+        
+        heads = self.available_heads()
+        if not heads:
+            raise ValueError("No models loaded")
+        results = [{} for _ in images]
+        errors = [None] * len(images)
+        hashes = [self._content_hash(image_bytes) for image_bytes in images]
+        sizes = {name: tuple(self.model_configs[name]['input_size']) for name in heads}
+        
+        # Serve what the cache already has and note which heads each image still needs
+        pending = {name: set() for name in heads}
+        for index, content_hash in enumerate(hashes):
+            for name in heads:
+                cached = self._cached_result(name, content_hash, tier)
+                if cached is None:
+                    pending[name].add(index)
+                else:
+                    results[index][HEAD_RESULT_KEYS[name]] = cached
+        
+        needed = {}
+        for name in heads:
+            needed.setdefault(sizes[name], set()).update(pending[name])
+        buffers = {size: self._acquire_batch(len(indices), tensor_shape(size))
+                   for size, indices in needed.items() if indices}
+        try:
+            # Decode each image once and write it into the next free row for every size it needs
+            filled = {size: [] for size in buffers}
+            for index, image_bytes in enumerate(images):
+                slots = {size: buffers[size][len(filled[size])] for size in buffers if index in needed[size]}
+                if not slots:
+                    continue
+                try:
+                    preprocess_into(image_bytes, slots, fast=settings.fast_preprocessing)
+                except Exception as e:
+                    logger.error("Error preprocessing batch image %d: %s", index, e)
+                    errors[index] = e
+                    continue
+                for size in slots:
+                    filled[size].append(index)
+            check_deadline("model inference")
+            
+            # One forward pass per head over the rows of every image that needs it
+            inputs = {}
+            for name in heads:
+                size = sizes[name]
+                rows = [row for row, index in enumerate(filled.get(size, ())) if index in pending[name]]
+                if not rows:
+                    continue
+                batch = buffers[size][:len(rows)] if len(rows) == len(filled[size]) else buffers[size][rows]
+                inputs[name] = ([filled[size][row] for row in rows], batch)
+            
+            analyzed = self._analyze_batches(inputs, len(images), hashes, tier)
+            for index, head_results in enumerate(analyzed):
+                for name, result in head_results.items():
+                    if self.result_cache is not None and hashes[index] is not None:
+                        self.result_cache.put(
+                            self._cache_key(name, hashes[index], tier, result['model_version']), result
+                        )
+                    results[index][HEAD_RESULT_KEYS[name]] = result
+        
+        except Exception as e:
+            logger.error("Error during batch analysis: %s", e)
+            raise
+        
+        finally:
+            for buffer in buffers.values():
+                self.buffer_pool.release(buffer)
+        
+        for index, result in enumerate(results):
+            if errors[index] is None:
+                self._add_overall_confidence(result)
+        
+        return [errors[index] or results[index] for index in range(len(images))]
+    
+    def analyze_preprocessed(self, processed, content_hashes=None, tier: Optional[str] = None):
+        """Run each head once over a list of already preprocessed images
+        
+        processed holds one {model_name: 1 x H x W x 3 array} dict per image, e.g.
+        decoded in other processes; heads missing from an image's dict are skipped
+        for it. Rows are copied into pooled batch buffers. Returns one
+        {model_name: result} dict per image.
+        """
+        self._check_inference_available("batch inference")
+        
+        inputs = {}
+        buffers = {}
+        try:
+            for name in ('classification', 'location', 'features'):
+                indices = [index for index, arrays in enumerate(processed) if name in arrays]
+                if not indices:
+                    continue
+                
+                # Heads sharing an input size share the arrays, so assemble their batch once
+                arrays = [processed[index][name] for index in indices]
+                key = tuple(id(array) for array in arrays)
+                if key not in buffers:
+                    buffers[key] = self._acquire_batch(len(arrays), arrays[0].shape[1:])
+                    for row, array in enumerate(arrays):
+                        buffers[key][row] = array[0]
+                inputs[name] = (indices, buffers[key][:len(indices)])
+            
+            return self._analyze_batches(inputs, len(processed), content_hashes, tier)
+        
+        finally:
+            for buffer in buffers.values():
+                self.buffer_pool.release(buffer)
+    
+    def _acquire_batch(self, rows: int, row_shape) -> np.ndarray:
+        """Pooled buffer with room for rows H x W x 3 inputs
+        
+        Rounded up to batch_max_size rows so varying batch sizes reuse the same buffers.
+        """
+        return self.buffer_pool.acquire((max(rows, settings.batch_max_size),) + tuple(row_shape))
+    
+    def _analyze_batches(self, inputs, count: int, content_hashes=None, tier: Optional[str] = None):
+        """Run each head on its assembled batch
+        
+        inputs maps a model name to (image indices, N x H x W x 3 array) with one
+        row per index. Returns one {model_name: result} dict for each of count images.
+        """
+        if content_hashes is None:
+            content_hashes = [None] * count
+        results = [{} for _ in range(count)]
+        
+        for name in ('classification', 'location', 'features'):
+            if name not in inputs:
+                continue
+            if not self.ensure_model(name):
+                raise ValueError(f"Model not loaded: {name}")
+            
+            indices, batch = inputs[name]
+            version = self.model_version(name, tier)
+            predictions = self.run_model(name, batch, tier)
+            
+            for index, prediction in zip(indices, predictions):
+                results[index][name] = self._head_result(
+                    name, prediction, self._index_hash(name, content_hashes[index], tier)
+                )
+                results[index][name]['model_version'] = version
+        
+        return results
+    
+    def _head_result(self, model_name: str, prediction, content_hash: Optional[str] = None):
+        """Turn one row of a head's output into its result dict"""
+        if model_name == 'classification':
+            return self._damage_result(prediction)
+        if model_name == 'location':
+            return self._location_result(prediction)
+        return self._features_result(prediction, content_hash)
+    
+    @staticmethod
+    def _add_overall_confidence(results):
+        """Average the classification and location confidences into the results"""
+        confidences = []
+        if 'damage_classification' in results:
+            confidences.append(results['damage_classification']['confidence'])
+        if 'damage_location' in results:
+            confidences.append(results['damage_location']['confidence'])
+        
+        if confidences:
+            results['overall_confidence'] = float(np.mean(confidences))
 
 # Initialize the model manager
 model_manager = ModelManager() 
\ No newline at end of file
@@ -0,0 +1,231 @@
+import numpy as np
+from PIL import Image, ImageOps
+import io
+import logging
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, Optional, Tuple
+from .metrics import STAGE_DURATION
+
+logger = logging.getLogger(__name__)
+
+class BufferPool:
+    """Free lists of preallocated float32 arrays keyed by shape"""
+
+    def __init__(self, max_free_per_shape: int = 32):
+        self.max_free_per_shape = max_free_per_shape
+        self._free = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def acquire(self, shape: Tuple[int, ...]) -> np.ndarray:
+        """Take a buffer of the given shape, allocating only when none is free"""
+        shape = tuple(shape)
+        with self._lock:
+            free = self._free.get(shape)
+            if free:
+                return free.pop()
+        return np.empty(shape, dtype=np.float32)
+
+    def release(self, buffer: np.ndarray):
+        """Return a buffer so later requests can reuse it"""
+        with self._lock:
+            free = self._free[buffer.shape]
+            if len(free) < self.max_free_per_shape:
+                free.append(buffer)
+
+class LetterboxedTensor(bytes):
+    """Raw uint8 H x W x 3 RGB pixels a client already letterboxed to a model input size
+
+    Kept as bytes so content hashing, caching and job storage treat it like an
+    upload; preprocessing only rescales it to float32.
+    """
+
+    def __new__(cls, data: bytes, shape: Tuple[int, int, int]):
+        tensor = super().__new__(cls, data)
+        tensor.shape = tuple(shape)
+        return tensor
+
+def tensor_shape(target_size: Tuple[int, int]) -> Tuple[int, int, int]:
+    """Pixel layout of a letterboxed input: target sizes are (width, height)"""
+    target_width, target_height = target_size
+    return (target_height, target_width, 3)
+
+def decode_image(image_bytes: bytes, draft_size: Optional[Tuple[int, int]] = None) -> Image.Image:
+    """Decode uploaded bytes into an RGB PIL image
+
+    With draft_size set, JPEGs are downscaled by the decoder (1/2, 1/4 or 1/8)
+    to the smallest scale still covering draft_size, and EXIF orientation is applied.
+    """
+    image = Image.open(io.BytesIO(image_bytes))
+    logger.debug("Original image size: %s, format: %s", image.size, image.format)
+
+    if draft_size is not None:
+        if image.format == 'JPEG':
+            # Request a square box so the scale still covers the target after rotation
+            side = max(draft_size)
+            image.draft('RGB', (side, side))
+        ImageOps.exif_transpose(image, in_place=True)
+
+    # Convert to RGB if necessary
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+        logger.debug("Converted image to RGB mode")
+
+    return image
+
+def letterbox_image(image: Image.Image, target_size: Tuple[int, int], fast: bool = False) -> np.ndarray:
+    """Resize with aspect ratio preserved, pad to target size and normalize
+
+    The fast path lets PIL reduce by an integer factor before the LANCZOS pass
+    and produces a float32 array instead of float64.
+    """
+    original_width, original_height = image.size
+    target_width, target_height = target_size
+
+    # Calculate scaling factor to fit within target size while preserving aspect ratio
+    scale_w = target_width / original_width
+    scale_h = target_height / original_height
+    scale = min(scale_w, scale_h)
+
+    # Resize with aspect ratio preserved
+    new_width = int(original_width * scale)
+    new_height = int(original_height * scale)
+    if fast:
+        resized = image.resize((new_width, new_height), Image.Resampling.LANCZOS, reducing_gap=2.0)
+    else:
+        resized = image.resize((new_width, new_height), Image.Resampling.LANCZOS)
+
+    # Create a new image with target size and paste the resized image in the center
+    final_image = Image.new('RGB', target_size, (0, 0, 0))  # Black background
+    paste_x = (target_width - new_width) // 2
+    paste_y = (target_height - new_height) // 2
+    final_image.paste(resized, (paste_x, paste_y))
+
+    logger.debug("Resized image to %s", target_size)
+
+    # Convert to numpy array and normalize
+    if fast:
+        image_array = np.asarray(final_image, dtype=np.float32)
+        image_array *= np.float32(1.0 / 255.0)
+        image_array = image_array[np.newaxis]
+    else:
+        image_array = np.array(final_image) / 255.0
+        image_array = np.expand_dims(image_array, axis=0)
+
+    logger.debug("Final image array shape: %s", image_array.shape)
+
+    return image_array
+
+def letterbox_into(image: Image.Image, out: np.ndarray):
+    """Letterbox straight into a preallocated H x W x 3 float32 slot
+
+    Equivalent to the fast path of letterbox_image without the padded PIL
+    canvas or any intermediate arrays.
+    """
+    target_height, target_width = out.shape[:2]
+    original_width, original_height = image.size
+
+    scale = min(target_width / original_width, target_height / original_height)
+    new_width = int(original_width * scale)
+    new_height = int(original_height * scale)
+    resized = image.resize((new_width, new_height), Image.Resampling.LANCZOS, reducing_gap=2.0)
+
+    paste_x = (target_width - new_width) // 2
+    paste_y = (target_height - new_height) // 2
+    out.fill(0.0)  # Black padding
+    np.multiply(
+        np.asarray(resized),
+        np.float32(1.0 / 255.0),
+        out=out[paste_y:paste_y + new_height, paste_x:paste_x + new_width],
+        casting='unsafe'
+    )
+
+    return out
+
+def preprocess_for_sizes(image_bytes: bytes, target_sizes: Iterable[Tuple[int, int]],
+                         fast: bool = False, pool: Optional[BufferPool] = None) -> Dict[Tuple[int, int], np.ndarray]:
+    """Decode once and letterbox once per distinct target size
+
+    With a pool (fast path only), every returned array is a pooled 1 x H x W x 3
+    buffer that the caller must release after inference.
+    """
+    target_sizes = list(dict.fromkeys(tuple(target_size) for target_size in target_sizes))
+    if isinstance(image_bytes, LetterboxedTensor):
+        return tensor_for_sizes(image_bytes, target_sizes, pool)
+
+    if fast and pool is not None:
+        processed = {
+            target_size: pool.acquire((1,) + tensor_shape(target_size)) for target_size in target_sizes
+        }
+        try:
+            preprocess_into(image_bytes, {size: buffer[0] for size, buffer in processed.items()}, fast=True)
+        except Exception:
+            for buffer in processed.values():
+                pool.release(buffer)
+            raise
+        return processed
+
+    image = _decode_for_sizes(image_bytes, target_sizes, fast)
+    started = time.perf_counter()
+    processed = {target_size: letterbox_image(image, target_size, fast) for target_size in target_sizes}
+    STAGE_DURATION.observe(time.perf_counter() - started, stage="resize")
+
+    return processed
+
+def preprocess_into(image_bytes: bytes, slots: Dict[Tuple[int, int], np.ndarray], fast: bool = False):
+    """Decode once and write each target size straight into its preallocated H x W x 3 float32 slot
+
+    Slots are usually rows of a pooled N x H x W x 3 batch buffer, so a batch
+    is assembled without per-image arrays or a concatenate copy.
+    """
+    if isinstance(image_bytes, LetterboxedTensor):
+        tensor_into(image_bytes, slots)
+        return
+
+    image = _decode_for_sizes(image_bytes, list(slots), fast)
+    started = time.perf_counter()
+    for target_size, out in slots.items():
+        if fast:
+            letterbox_into(image, out)
+        else:
+            out[...] = letterbox_image(image, target_size)[0]
+    STAGE_DURATION.observe(time.perf_counter() - started, stage="resize")
+
+def _decode_for_sizes(image_bytes: bytes, target_sizes, fast: bool) -> Image.Image:
+    draft_size = None
+    if fast and target_sizes:
+        draft_size = (max(size[0] for size in target_sizes), max(size[1] for size in target_sizes))
+    with STAGE_DURATION.time(stage="decode"):
+        return decode_image(image_bytes, draft_size)
+
+def tensor_for_sizes(tensor: LetterboxedTensor, target_sizes: Iterable[Tuple[int, int]],
+                     pool: Optional[BufferPool] = None) -> Dict[Tuple[int, int], np.ndarray]:
+    """Scale a client-letterboxed tensor to float32 for each target size, with no decode or resize"""
+    processed = {}
+    for target_size in target_sizes:
+        target_size = tuple(target_size)
+        if target_size in processed:
+            continue
+        shape = (1,) + tensor_shape(target_size)
+        processed[target_size] = pool.acquire(shape) if pool is not None else np.empty(shape, dtype=np.float32)
+    try:
+        tensor_into(tensor, {size: buffer[0] for size, buffer in processed.items()})
+    except Exception:
+        if pool is not None:
+            for buffer in processed.values():
+                pool.release(buffer)
+        raise
+
+    return processed
+
+def tensor_into(tensor: LetterboxedTensor, slots: Dict[Tuple[int, int], np.ndarray]):
+    """Scale a client-letterboxed tensor into each target size's H x W x 3 float32 slot"""
+    started = time.perf_counter()
+    pixels = np.frombuffer(tensor, dtype=np.uint8).reshape(tensor.shape)
+    for target_size, out in slots.items():
+        shape = tensor_shape(target_size)
+        if shape != pixels.shape:
+            raise ValueError(f"Tensor shape {pixels.shape} does not match model input {shape}")
+        np.multiply(pixels, np.float32(1.0 / 255.0), out=out, casting='unsafe')
+    STAGE_DURATION.observe(time.perf_counter() - started, stage="tensor_input")
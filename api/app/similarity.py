@@ -0,0 +1,272 @@
+import numpy as np
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List
+
+from .locking import file_lock
+
+logger = logging.getLogger(__name__)
+
+# Number of set bits for every byte value, used for vectorized Hamming distances
+_POPCOUNT = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1).astype(np.uint16)
+
+class FeatureIndex:
+    """Append-only, memory-mapped store of feature vectors with nearest-neighbour search
+
+    New vectors are buffered in memory and written out together once
+    flush_rows are pending or flush_interval_seconds have passed, so requests
+    do not each pay an msync over the whole mapping. Buffered vectors are
+    searchable in this process straight away and in other workers after the
+    flush; call flush() on shutdown to keep them.
+    """
+
+    ID_BYTES = 32  # SHA-256 digest of the image content
+    GROWTH_ROWS = 4096
+    SEARCH_CHUNK_ROWS = 65536
+
+    def __init__(self, index_dir: str, dtype: str = "float16", code_bits: int = 256,
+                 approximate_candidates: int = 256, seed: int = 0, flush_rows: int = 64,
+                 flush_interval_seconds: float = 5.0):
+        self.index_dir = Path(index_dir)
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        self.dtype = np.dtype(dtype)
+        self.code_bits = code_bits
+        self.approximate_candidates = approximate_candidates
+        self.seed = seed
+        self.flush_rows = max(1, flush_rows)
+        self.flush_interval_seconds = flush_interval_seconds
+
+        self.dim = None
+        self.count = 0
+        self.capacity = 0
+        self._vectors = None
+        self._ids = None
+        self._codes = None
+        self._projection = None
+        self._rows_by_id: Dict[bytes, int] = {}
+        self._pending: Dict[bytes, np.ndarray] = {}  # Normalized vectors not yet written, by id
+        self._flush_timer = None
+        self._lock = threading.RLock()
+
+        self._meta_path = self.index_dir / "meta.json"
+        self._lock_path = self.index_dir / "index.lock"
+        self._refresh()
+
+    def __len__(self):
+        with self._lock:
+            self._refresh()
+            return self.count + len(self._pending)
+
+    def add(self, image_id: str, vector) -> bool:
+        """Buffer a vector under an image's content hash; returns False if already present"""
+        vector = self._normalize(np.asarray(vector, dtype=np.float32).ravel())
+        key = bytes.fromhex(image_id)
+
+        with self._lock:
+            if key in self._rows_by_id or key in self._pending:
+                return False
+            dim = self._dim()
+            if dim is not None and vector.shape[0] != dim:
+                raise ValueError(f"Feature dimension {vector.shape[0]} does not match index dimension {dim}")
+
+            self._pending[key] = vector
+            if len(self._pending) >= self.flush_rows:
+                self.flush()
+            elif self._flush_timer is None and self.flush_interval_seconds > 0:
+                self._flush_timer = threading.Timer(self.flush_interval_seconds, self._flush_in_background)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+            return True
+
+    def flush(self):
+        """Write buffered vectors to the shared files with one msync and metadata update"""
+        with self._lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            if not self._pending:
+                return
+
+            started = time.perf_counter()
+            with self._file_lock():
+                self._refresh()
+                written = 0
+                for key, vector in self._pending.items():
+                    # Another worker may have stored the same image since it was buffered
+                    if key in self._rows_by_id:
+                        continue
+                    if self.dim is None:
+                        self.dim = vector.shape[0]
+                    elif vector.shape[0] != self.dim:
+                        logger.warning("Dropping feature vector of dimension %d; index dimension is %d",
+                                       vector.shape[0], self.dim)
+                        continue
+
+                    if self.count >= self.capacity:
+                        self._open(self.capacity + self.GROWTH_ROWS)
+
+                    row = self.count
+                    self._vectors[row] = vector
+                    self._ids[row] = np.frombuffer(key, dtype=np.uint8)
+                    self._codes[row] = self._encode(vector[None, :])[0]
+                    self.count += 1
+                    self._rows_by_id[key] = row
+                    written += 1
+                if written:
+                    self._write_meta()
+            self._pending = {}
+            logger.debug("Flushed %d feature vectors in %.1f ms", written, (time.perf_counter() - started) * 1000)
+
+    def _flush_in_background(self):
+        with self._lock:
+            self._flush_timer = None
+        try:
+            self.flush()
+        except Exception as e:
+            logger.warning("Could not flush the similarity index: %s", e)
+
+    def _dim(self):
+        if self.dim is not None:
+            return self.dim
+        return next(iter(self._pending.values())).shape[0] if self._pending else None
+
+    def search(self, vector, k: int = 5, approximate: bool = False) -> List[Dict[str, float]]:
+        """Return the k most similar stored images by cosine similarity"""
+        query = self._normalize(np.asarray(vector, dtype=np.float32).ravel())
+
+        with self._lock:
+            self._refresh()
+            if self.count == 0 and not self._pending:
+                return []
+            dim = self._dim()
+            if query.shape[0] != dim:
+                raise ValueError(f"Feature dimension {query.shape[0]} does not match index dimension {dim}")
+
+            matches = []
+            if self.count > 0:
+                stored_k = min(k, self.count)
+                if approximate and self.count > self.approximate_candidates:
+                    rows, scores = self._search_approximate(query, stored_k)
+                else:
+                    rows, scores = self._search_exact(query, stored_k)
+                matches = [(self._ids[row].tobytes(), float(score)) for row, score in zip(rows, scores)]
+
+            # Buffered vectors are few, so they are always scored exactly
+            matches += [
+                (key, float(vector @ query)) for key, vector in self._pending.items() if key not in self._rows_by_id
+            ]
+            matches.sort(key=lambda match: -match[1])
+
+            return [
+                {"image_id": key.hex(), "similarity": round(score, 6)}
+                for key, score in matches[:k]
+            ]
+
+    def _search_exact(self, query: np.ndarray, k: int):
+        best_rows = np.empty(0, dtype=np.int64)
+        best_scores = np.empty(0, dtype=np.float32)
+
+        # Score in chunks so reduced-precision storage is widened a slice at a time
+        for start in range(0, self.count, self.SEARCH_CHUNK_ROWS):
+            stop = min(start + self.SEARCH_CHUNK_ROWS, self.count)
+            scores = self._vectors[start:stop].astype(np.float32, copy=False) @ query
+            rows = np.arange(start, stop)
+            if scores.shape[0] > k:
+                top = np.argpartition(-scores, k - 1)[:k]
+                scores, rows = scores[top], rows[top]
+            best_rows = np.concatenate([best_rows, rows])
+            best_scores = np.concatenate([best_scores, scores])
+
+        return self._top_k(best_rows, best_scores, k)
+
+    def _search_approximate(self, query: np.ndarray, k: int):
+        # Shortlist by Hamming distance between random-hyperplane codes, then rerank exactly
+        query_code = self._encode(query[None, :])[0]
+        distances = _POPCOUNT[np.bitwise_xor(self._codes[:self.count], query_code)].sum(axis=1)
+        shortlist = min(self.count, max(self.approximate_candidates, k))
+        candidates = np.argpartition(distances, shortlist - 1)[:shortlist]
+        candidates.sort()
+
+        scores = self._vectors[candidates].astype(np.float32) @ query
+        return self._top_k(candidates, scores, k)
+
+    @staticmethod
+    def _top_k(rows: np.ndarray, scores: np.ndarray, k: int):
+        order = np.argsort(-scores)[:k]
+        return rows[order], scores[order]
+
+    @staticmethod
+    def _normalize(vector: np.ndarray) -> np.ndarray:
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def _encode(self, vectors: np.ndarray) -> np.ndarray:
+        if self._projection is None:
+            rng = np.random.default_rng(self.seed)
+            self._projection = rng.standard_normal((self.dim, self.code_bits)).astype(np.float32)
+        return np.packbits(vectors @ self._projection > 0, axis=1)
+
+    @contextmanager
+    def _file_lock(self):
+        # Serializes appends between worker processes sharing the index directory
+        with file_lock(self._lock_path):
+            yield
+
+    def _refresh(self):
+        """Pick up rows appended by other processes since the last read"""
+        if not self._meta_path.exists():
+            return
+        with open(self._meta_path, "r") as f:
+            meta = json.load(f)
+        if meta["count"] == self.count and meta["capacity"] == self.capacity:
+            return
+
+        self.dim = meta["dim"]
+        self.code_bits = meta["code_bits"]
+        self.seed = meta["seed"]
+        self.dtype = np.dtype(meta["dtype"])
+        if meta["capacity"] != self.capacity:
+            self._open(meta["capacity"])
+
+        for row in range(self.count, meta["count"]):
+            self._rows_by_id[self._ids[row].tobytes()] = row
+        self.count = meta["count"]
+
+    def _open(self, capacity: int):
+        """Map the backing files, growing them to the requested capacity"""
+        for array in (self._vectors, self._ids, self._codes):
+            if array is not None:
+                array.flush()
+
+        self._vectors = self._map("vectors.bin", self.dtype, (capacity, self.dim))
+        self._ids = self._map("ids.bin", np.uint8, (capacity, self.ID_BYTES))
+        self._codes = self._map("codes.bin", np.uint8, (capacity, self.code_bits // 8))
+        self.capacity = capacity
+
+    def _map(self, name: str, dtype, shape):
+        path = self.index_dir / name
+        size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        with open(path, "ab") as f:
+            if f.tell() < size:
+                f.truncate(size)
+        return np.memmap(path, dtype=dtype, mode="r+", shape=shape)
+
+    def _write_meta(self):
+        for array in (self._vectors, self._ids, self._codes):
+            array.flush()
+        meta = {
+            "dim": self.dim,
+            "dtype": self.dtype.name,
+            "code_bits": self.code_bits,
+            "seed": self.seed,
+            "count": self.count,
+            "capacity": self.capacity
+        }
+        tmp_path = self._meta_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        tmp_path.replace(self._meta_path)
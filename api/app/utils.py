@@ -1,35 +1,126 @@
 from fastapi import UploadFile, HTTPException
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+from PIL import Image, UnidentifiedImageError
+import numpy as np
 from .config import settings
+from .metrics import STAGE_DURATION, record_error
+from .preprocessing import LetterboxedTensor
+import io
 import logging
 import time
 
 logger = logging.getLogger(__name__)
 
-async def validate_image_file(file: UploadFile) -> None:
-    """Validate uploaded image file"""
+# Leading bytes that identify each supported image format
+IMAGE_SIGNATURES = {
+    "jpeg": (b"\xff\xd8\xff",),
+    "png": (b"\x89PNG\r\n\x1a\n",),
+    "webp": (b"RIFF",),
+}
+
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+def sniff_image_format(header: bytes) -> Optional[str]:
+    """Identify the image format from its magic bytes"""
+    for image_format, signatures in IMAGE_SIGNATURES.items():
+        if any(header.startswith(signature) for signature in signatures):
+            if image_format == "webp" and header[8:12] != b"WEBP":
+                continue
+            return image_format
+    return None
+
+async def read_upload(file: UploadFile) -> bytes:
+    """Read an upload once, enforcing the size limit"""
+    max_size = settings.max_file_size
+    too_large = HTTPException(
+        status_code=413,
+        detail=f"File too large. Max size: {max_size // (1024 * 1024)}MB"
+    )
+    
+    # Reject on the declared size without touching the body
+    declared_size = getattr(file, "size", None)
+    if declared_size is not None and declared_size > max_size:
+        raise too_large
+    
+    started = time.perf_counter()
+    if declared_size is not None:
+        # One read of at most max_size + 1 bytes, so oversize bodies are still caught
+        file_content = await file.read(max_size + 1)
+    else:
+        chunks = []
+        total = 0
+        while True:
+            chunk = await file.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            total += len(chunk)
+            if total > max_size:
+                raise too_large
+            chunks.append(chunk)
+        file_content = b"".join(chunks)
+    
+    STAGE_DURATION.observe(time.perf_counter() - started, stage="upload_read")
     
-    # Check file extension
-    if not file.filename:
-        raise HTTPException(status_code=400, detail="No filename provided")
+    if len(file_content) > max_size:
+        raise too_large
+    if not file_content:
+        raise HTTPException(status_code=400, detail="Empty file")
     
-    file_extension = file.filename.split('.')[-1].lower()
-    if file_extension not in settings.allowed_extensions:
+    return file_content
+
+async def read_image_upload(file: UploadFile) -> bytes:
+    """Read an upload once, enforcing size, format and pixel limits before any decode"""
+    file_content = await read_upload(file)
+    validation_started = time.perf_counter()
+    
+    # Check the real format rather than the filename extension
+    image_format = sniff_image_format(file_content[:16])
+    allowed = {"jpeg" if ext in ("jpg", "jpeg") else ext for ext in settings.allowed_extensions}
+    if image_format is None or image_format not in allowed:
         raise HTTPException(
             status_code=400,
             detail=f"File type not supported. Allowed: {', '.join(settings.allowed_extensions)}"
         )
     
-    # Check file size
-    file_content = await file.read()
-    if len(file_content) > settings.max_file_size:
+    # Image.open only parses the header, so this rejects decompression bombs cheaply
+    try:
+        with Image.open(io.BytesIO(file_content)) as image:
+            width, height = image.size
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid image: {e}")
+    
+    if width * height > settings.max_image_pixels:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Image dimensions too large: {width}x{height}. "
+                   f"Max pixels: {settings.max_image_pixels}"
+        )
+    
+    STAGE_DURATION.observe(time.perf_counter() - validation_started, stage="validation")
+    return file_content
+
+async def read_tensor_upload(file: UploadFile, shape) -> LetterboxedTensor:
+    """Read a client-letterboxed uint8 tensor, which must be exactly the expected shape"""
+    file_content = await read_upload(file)
+    
+    height, width, channels = shape
+    expected = height * width * channels
+    if len(file_content) != expected:
         raise HTTPException(
-            status_code=413,
-            detail=f"File too large. Max size: {settings.max_file_size // (1024 * 1024)}MB"
+            status_code=400,
+            detail=f"Invalid tensor: expected {expected} bytes (uint8 {height}x{width}x{channels}), "
+                   f"got {len(file_content)}"
         )
     
-    # Reset file pointer
-    await file.seek(0)
+    return LetterboxedTensor(file_content, shape)
+
+def image_pixels(file_content: bytes) -> int:
+    """Pixel count of a validated upload, read from its header without decoding"""
+    if isinstance(file_content, LetterboxedTensor):
+        return file_content.shape[0] * file_content.shape[1]
+    with Image.open(io.BytesIO(file_content)) as image:
+        width, height = image.size
+    return width * height
 
 def format_response(prediction_result: Dict[str, Any], include_probabilities: bool = False) -> Dict[str, Any]:
     """Format prediction response"""
@@ -41,7 +132,7 @@ def format_response(prediction_result: Dict[str, Any], include_probabilities: bo
             "confidence_percentage": f"{prediction_result['confidence']:.1%}"
         },
         "metadata": {
-            "model_version": "1.0.0",
+            "model_version": prediction_result.get("model_version", settings.model_version),
             "timestamp": time.time()
         }
     }
@@ -53,11 +144,22 @@ def format_response(prediction_result: Dict[str, Any], include_probabilities: bo
 
 def format_comprehensive_response(analysis_result: Dict[str, Any], include_probabilities: bool = False) -> Dict[str, Any]:
     """Format comprehensive analysis response"""
+    model_versions = {
+        key: result["model_version"]
+        for key, result in analysis_result.items()
+        if isinstance(result, dict) and "model_version" in result
+    }
+    # One version for clients reading the single field: the severity head's, else the first head served
+    model_version = model_versions.get(
+        "damage_classification", next(iter(model_versions.values()), settings.model_version)
+    )
+    
     response = {
         "success": True,
         "data": {},
         "metadata": {
-            "model_version": "1.0.0",
+            "model_version": model_version,
+            "model_versions": model_versions,
             "timestamp": time.time(),
             "models_used": list(analysis_result.keys())
         }
@@ -105,8 +207,37 @@ def format_comprehensive_response(analysis_result: Dict[str, Any], include_proba
     
     return response
 
+def filter_analysis_result(analysis_result: Dict[str, Any], models: str = "all") -> Dict[str, Any]:
+    """Keep only the requested models' results and recompute the overall confidence"""
+    if models == "all":
+        return analysis_result
+    
+    requested_models = [m.strip() for m in models.split(",")]
+    filtered_result = {}
+    
+    for model in requested_models:
+        if model == "classification" and "damage_classification" in analysis_result:
+            filtered_result["damage_classification"] = analysis_result["damage_classification"]
+        elif model == "location" and "damage_location" in analysis_result:
+            filtered_result["damage_location"] = analysis_result["damage_location"]
+        elif model == "features" and "features" in analysis_result:
+            filtered_result["features"] = analysis_result["features"]
+    
+    # Recalculate overall confidence for filtered results
+    if len(filtered_result) > 0:
+        confidences = []
+        if 'damage_classification' in filtered_result:
+            confidences.append(filtered_result['damage_classification']['confidence'])
+        if 'damage_location' in filtered_result:
+            confidences.append(filtered_result['damage_location']['confidence'])
+        if confidences:
+            filtered_result['overall_confidence'] = float(np.mean(confidences))
+    
+    return filtered_result
+
 def create_error_response(error_message: str, error_code: str = "PREDICTION_ERROR") -> Dict[str, Any]:
     """Create standardized error response"""
+    record_error(error_code)
     return {
         "success": False,
         "error": {
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for the Car Damage Detection API hot paths
+Builds seeded stand-in Keras models with the production input and output
+shapes, times preprocessing, every predict path, comprehensive analysis and
+the response formatters over synthetic images, checks the preprocessing
+paths against the original letterbox and writes or compares a JSON baseline
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import logging
+import tempfile
+import statistics
+from pathlib import Path
+
+import numpy as np
+
+# Add the current directory to Python path
+current_dir = Path(__file__).parent
+sys.path.insert(0, str(current_dir))
+
+from preprocessing_parity import MAX_DIFF, MEAN_DIFF, check_parity, make_image
+
+# Synthetic corpus: (name, width, height, format)
+CORPUS = [
+    ("jpeg_640x480", 640, 480, "JPEG"),
+    ("jpeg_1600x1200", 1600, 1200, "JPEG"),
+    ("jpeg_4000x3000", 4000, 3000, "JPEG"),
+    ("png_1024x768", 1024, 768, "PNG"),
+]
+
+def parse_args():
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description="Benchmark the damage detection hot paths")
+    parser.add_argument("--output", default="benchmark_results.json", help="Where to write this run's results")
+    parser.add_argument("--baseline", help="Earlier results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="Median slowdown vs the baseline reported as a regression (0.10 = 10%%)")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Exit non-zero on any regression")
+    parser.add_argument("--models-dir", default=str(Path(tempfile.gettempdir()) / "damage-benchmark-models"),
+                        help="Where the stand-in models are built and cached")
+    parser.add_argument("--feature-dim", type=int, default=512, help="Length of the stand-in feature vector")
+    parser.add_argument("--iterations", type=int, default=30, help="Timed iterations per benchmark")
+    parser.add_argument("--warmup", type=int, default=3, help="Untimed iterations per benchmark")
+    parser.add_argument("--filter", default="", help="Only run benchmarks whose name contains this text")
+    parser.add_argument("--parity-max-diff", type=float, default=MAX_DIFF,
+                        help="Largest per-pixel difference allowed against the original preprocessing")
+    parser.add_argument("--parity-mean-diff", type=float, default=MEAN_DIFF,
+                        help="Largest mean difference allowed against the original preprocessing")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for models and images")
+    return parser.parse_args()
+
+def build_stand_in_models(models_dir: Path, feature_dim: int, seed: int):
+    """Write seeded .h5 models with the input and output shapes model_configs expects"""
+    import tensorflow as tf
+
+    heads = {
+        "car_damage_classification_model.h5": (3, "softmax"),
+        "ft_model_locn.h5": (4, "softmax"),
+        "ft_model.h5": (feature_dim, None),
+    }
+    models_dir.mkdir(parents=True, exist_ok=True)
+    tf.keras.utils.set_random_seed(seed)
+
+    for file_name, (outputs, activation) in heads.items():
+        path = models_dir / file_name
+        if path.exists():
+            continue
+        # A small conv stack so inference cost is measurable without the real weights
+        inputs = tf.keras.Input((256, 256, 3))
+        x = inputs
+        for filters in (16, 32, 64, 128):
+            x = tf.keras.layers.Conv2D(filters, 3, strides=2, padding="same", activation="relu")(x)
+        x = tf.keras.layers.GlobalAveragePooling2D()(x)
+        x = tf.keras.layers.Dense(outputs, activation=activation)(x)
+        tf.keras.Model(inputs, x).save(str(path))
+        print(f"Built stand-in model {path}")
+
+def time_call(func, iterations: int, warmup: int):
+    """Median, p90, mean and min wall time of a call in milliseconds"""
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        "median_ms": round(statistics.median(samples), 4),
+        "p90_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.9))], 4),
+        "mean_ms": round(statistics.fmean(samples), 4),
+        "min_ms": round(samples[0], 4),
+        "iterations": iterations
+    }
+
+def compare(results, baseline, tolerance: float):
+    """Print median changes against the baseline and return the regressed names"""
+    regressions = []
+    print(f"\n{'benchmark':<48} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name, current in results.items():
+        previous = baseline.get("results", {}).get(name)
+        if previous is None:
+            print(f"{name:<48} {'-':>10} {current['median_ms']:>10.3f} {'new':>8}")
+            continue
+        change = current["median_ms"] / max(previous["median_ms"], 1e-9) - 1
+        flag = " REGRESSION" if change > tolerance else ""
+        if flag:
+            regressions.append(name)
+        print(f"{name:<48} {previous['median_ms']:>10.3f} {current['median_ms']:>10.3f} {change:>+7.1%}{flag}")
+    return regressions
+
+def main():
+    """Main function"""
+    # App logs at INFO would interleave with the result table
+    logging.basicConfig(
+        level=logging.WARNING,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    args = parse_args()
+    models_dir = Path(args.models_dir)
+
+    # Measure the code paths themselves: no cache hits, no index writes, no batching window
+    os.environ["MODEL_DIR"] = str(models_dir)
+    os.environ.setdefault("RESULT_CACHE_ENABLED", "false")
+    os.environ.setdefault("FEATURE_INDEX_ENABLED", "false")
+    os.environ.setdefault("BATCHING_ENABLED", "false")
+    # Time the fast preprocessing path; preprocess_exact covers the default one
+    os.environ.setdefault("FAST_PREPROCESSING", "true")
+    for setting in ("CLASSIFICATION_MODEL", "LOCATION_MODEL", "FEATURE_MODEL"):
+        os.environ.pop(setting, None)
+
+    build_stand_in_models(models_dir, args.feature_dim, args.seed)
+
+    from app.config import settings
+    from app.model_loader import model_manager
+    from app.encoding import dumps_json
+    from app.preprocessing import LetterboxedTensor, preprocess_for_sizes
+    from app.utils import format_response, format_comprehensive_response
+
+    model_manager.load_models()
+    corpus = {
+        name: make_image(width, height, image_format, args.seed + index)
+        for index, (name, width, height, image_format) in enumerate(CORPUS)
+    }
+    target_sizes = sorted({tuple(config["input_size"]) for config in model_manager.model_configs.values()})
+
+    benchmarks = {}
+    for name, image_bytes in corpus.items():
+        benchmarks[f"preprocess[{name}]"] = (
+            lambda image_bytes=image_bytes: model_manager.smart_preprocess_image(image_bytes, "classification")
+        )
+        benchmarks[f"preprocess_exact[{name}]"] = (
+            lambda image_bytes=image_bytes: preprocess_for_sizes(image_bytes, target_sizes, fast=False)
+        )
+        benchmarks[f"comprehensive_analysis[{name}]"] = (
+            lambda image_bytes=image_bytes: model_manager.comprehensive_analysis(image_bytes)
+        )
+
+    # Client-letterboxed input skips decode and resize entirely
+    tensor_shape = model_manager.tensor_shape(list(model_manager.model_configs))
+    tensor = LetterboxedTensor(np.full(tensor_shape, 127, dtype=np.uint8).tobytes(), tensor_shape)
+    benchmarks["preprocess[tensor]"] = lambda: model_manager.smart_preprocess_image(tensor, "classification")
+    benchmarks["comprehensive_analysis[tensor]"] = lambda: model_manager.comprehensive_analysis(tensor)
+
+    sample = corpus["jpeg_1600x1200"]
+    benchmarks["predict_damage[jpeg_1600x1200]"] = lambda: model_manager.predict_damage(sample)
+    benchmarks["predict_location[jpeg_1600x1200]"] = lambda: model_manager.predict_location(sample)
+    benchmarks["extract_features[jpeg_1600x1200]"] = lambda: model_manager.extract_features(sample)
+    batch = [corpus[name] for name in corpus] * 4
+    benchmarks[f"comprehensive_analysis_batch[{len(batch)} images]"] = (
+        lambda: model_manager.comprehensive_analysis_batch(batch)
+    )
+
+    prediction = model_manager.predict_damage(sample)
+    analysis = model_manager.comprehensive_analysis(sample)
+    benchmarks["format_response"] = lambda: format_response(prediction, True)
+    benchmarks["format_comprehensive_response"] = lambda: format_comprehensive_response(analysis, True)
+    benchmarks["serialize_comprehensive_json"] = (
+        lambda: dumps_json(format_comprehensive_response(analysis, True))
+    )
+    benchmarks["serialize_comprehensive_stdlib_json"] = (
+        lambda: json.dumps(format_comprehensive_response(analysis, True))
+    )
+
+    results = {}
+    for name, func in benchmarks.items():
+        if args.filter and args.filter not in name:
+            continue
+        results[name] = time_call(func, args.iterations, args.warmup)
+        print(f"{name:<48} median {results[name]['median_ms']:>9.3f} ms   p90 {results[name]['p90_ms']:>9.3f} ms")
+
+    parity_passed, parity = check_parity(corpus, target_sizes, args.parity_max_diff, args.parity_mean_diff)
+    for name, entry in parity.items():
+        if "max_abs_diff" not in entry:
+            print(f"parity {name:<41} shape {entry['shape']} != {entry['expected_shape']}  FAILED")
+            continue
+        print(f"parity {name:<41} max {entry['max_abs_diff']:.4f}  mean {entry['mean_abs_diff']:.5f}"
+              f"{'' if entry['passed'] else '  FAILED'}")
+
+    import tensorflow as tf
+    output = {
+        "meta": {
+            "created": time.time(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "numpy": np.__version__,
+            "tensorflow": tf.__version__,
+            "settings": {
+                "fast_preprocessing": settings.fast_preprocessing,
+                "inference_backend": settings.inference_backend,
+                "compiled_inference": settings.compiled_inference,
+                "batching_enabled": settings.batching_enabled,
+                "feature_dim": args.feature_dim
+            }
+        },
+        "results": results,
+        "parity": parity
+    }
+    with open(args.output, "w") as f:
+        json.dump(output, f, indent=2)
+    print(f"\nWrote {args.output}")
+
+    failed = not parity_passed
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} benchmark(s) regressed by more than {args.tolerance:.0%}")
+            failed = failed or args.fail_on_regression
+    if not parity_passed:
+        print("\nPreprocessing drifted from the original letterbox beyond the parity limits")
+
+    model_manager.shutdown()
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Convert the configured .h5 models into cached serving artifacts
+Run at deploy time so workers start from the SavedModel, TFLite or ONNX files
+instead of converting on their first start
+"""
+
+import sys
+import argparse
+import logging
+from pathlib import Path
+
+# Add the current directory to Python path
+current_dir = Path(__file__).parent
+sys.path.insert(0, str(current_dir))
+
+logger = logging.getLogger("convert_models")
+
+def parse_args():
+    """Parse command line options"""
+    from app.config import settings
+
+    parser = argparse.ArgumentParser(description="Convert the damage detection models to serving artifacts")
+    parser.add_argument("--format", choices=["savedmodel", "tflite", "onnx"],
+                        default=settings.inference_backend if settings.inference_backend != "keras" else "savedmodel",
+                        help="Artifact format (default: INFERENCE_BACKEND, or savedmodel)")
+    parser.add_argument("--artifact-dir", default=settings.artifact_dir,
+                        help="Where to write artifacts (default: next to each .h5 file)")
+    return parser.parse_args()
+
+def main():
+    """Main function"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    args = parse_args()
+
+    from app.config import settings
+    from app.artifacts import convert_model
+
+    failed = 0
+    for model_file in (settings.classification_model, settings.location_model, settings.feature_model):
+        model_path = Path(settings.model_dir) / model_file
+        if not model_path.exists():
+            logger.warning(f"Model not found: {model_path}")
+            continue
+        try:
+            artifact = convert_model(model_path, args.format, args.artifact_dir)
+            logger.info(f"{model_file} -> {artifact}")
+        except Exception as e:
+            logger.error(f"Could not convert {model_file}: {e}")
+            failed += 1
+
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Parity check for the fast preprocessing path
+Synthetic photo-like images and a frozen copy of the original
+smart_preprocess_image letterbox, shared by the test suite and benchmark.py
+"""
+
+import io
+
+import numpy as np
+from PIL import Image
+
+# Measured worst case on CORPUS: max about 0.016 (4/255), mean about 0.002
+MAX_DIFF = 0.02
+MEAN_DIFF = 0.003
+
+# Synthetic corpus: (name, width, height, format, mode)
+CORPUS = [
+    ("jpeg_4000x3000", 4000, 3000, "JPEG", "RGB"),
+    ("jpeg_1600x1200", 1600, 1200, "JPEG", "RGB"),
+    ("jpeg_640x480", 640, 480, "JPEG", "RGB"),
+    ("jpeg_portrait_1200x1600", 1200, 1600, "JPEG", "RGB"),
+    ("jpeg_panorama_3000x700", 3000, 700, "JPEG", "RGB"),
+    ("jpeg_small_200x150", 200, 150, "JPEG", "RGB"),
+    ("jpeg_grayscale_1024x768", 1024, 768, "JPEG", "L"),
+    ("png_1024x768", 1024, 768, "PNG", "RGB"),
+    ("png_rgba_800x600", 800, 600, "PNG", "RGBA"),
+    ("webp_1280x960", 1280, 960, "WEBP", "RGB"),
+]
+
+def make_image(width: int, height: int, image_format: str, seed: int, mode: str = "RGB") -> bytes:
+    """Smooth gradients plus noise, so codecs see photo-like content"""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    base = np.stack([
+        127 + 100 * np.sin(x / (width / 3.0) + phase) * np.cos(y / (height / 2.0) - phase)
+        for phase in rng.uniform(0, np.pi, size=4)
+    ], axis=-1)
+    noise = rng.normal(0, 12, size=(height, width, 4)).astype(np.float32)
+    pixels = np.clip(base + noise, 0, 255).astype(np.uint8)
+
+    image = Image.fromarray(pixels, "RGBA").convert(mode)
+    buffer = io.BytesIO()
+    image.save(buffer, image_format, **({"quality": 90} if image_format in ("JPEG", "WEBP") else {}))
+    return buffer.getvalue()
+
+def make_corpus(seed: int = 0):
+    """CORPUS rendered to encoded bytes, keyed by name"""
+    return {
+        name: make_image(width, height, image_format, seed + index, mode)
+        for index, (name, width, height, image_format, mode) in enumerate(CORPUS)
+    }
+
+def legacy_preprocess(image_bytes: bytes, target_size) -> np.ndarray:
+    """ModelManager.smart_preprocess_image as it was before the fast path, kept as the reference"""
+    image = Image.open(io.BytesIO(image_bytes))
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+
+    original_width, original_height = image.size
+    target_width, target_height = target_size
+    scale = min(target_width / original_width, target_height / original_height)
+    new_width = int(original_width * scale)
+    new_height = int(original_height * scale)
+    image = image.resize((new_width, new_height), Image.Resampling.LANCZOS)
+
+    final_image = Image.new('RGB', target_size, (0, 0, 0))
+    final_image.paste(image, ((target_width - new_width) // 2, (target_height - new_height) // 2))
+
+    image_array = np.array(final_image) / 255.0
+    return np.expand_dims(image_array, axis=0)
+
+def check_parity(corpus, target_sizes, max_diff: float = MAX_DIFF, mean_diff: float = MEAN_DIFF):
+    """Compare the fast, pooled-fast and exact preprocessing paths against the legacy letterbox
+
+    Returns whether every image passed and a report keyed by image, size and path.
+    """
+    from app.preprocessing import BufferPool, preprocess_for_sizes
+
+    pool = BufferPool()
+    report = {}
+    passed = True
+    for name, image_bytes in corpus.items():
+        candidates = {
+            "fast": preprocess_for_sizes(image_bytes, target_sizes, fast=True),
+            "pooled": preprocess_for_sizes(image_bytes, target_sizes, fast=True, pool=pool),
+            "exact": preprocess_for_sizes(image_bytes, target_sizes, fast=False),
+        }
+        for size in candidates["exact"]:
+            reference = legacy_preprocess(image_bytes, size)
+            for path_name, by_size in candidates.items():
+                candidate = by_size[size]
+                if candidate.shape != reference.shape:
+                    ok = False
+                    entry = {"shape": list(candidate.shape), "expected_shape": list(reference.shape)}
+                else:
+                    diff = np.abs(candidate.astype(np.float64) - reference)
+                    ok = float(diff.max()) <= max_diff and float(diff.mean()) <= mean_diff
+                    entry = {"max_abs_diff": round(float(diff.max()), 6), "mean_abs_diff": round(float(diff.mean()), 6)}
+                entry["passed"] = ok
+                passed = passed and ok
+                report[f"{name}@{size[0]}x{size[1]}/{path_name}"] = entry
+            pool.release(candidates["pooled"][size])
+    return passed, report
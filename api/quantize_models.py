@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Build quantized fast-tier variants of the damage detection models
+Calibrates on a set of claim images, compares every variant against its
+float model on held-out images and only marks variants that pass the
+accuracy gate as servable
+"""
+
+import sys
+import json
+import time
+import argparse
+import logging
+from pathlib import Path
+
+import numpy as np
+
+# Add the current directory to Python path
+current_dir = Path(__file__).parent
+sys.path.insert(0, str(current_dir))
+
+logger = logging.getLogger("quantize_models")
+
+def parse_args():
+    """Parse command line options"""
+    from app.config import settings
+
+    parser = argparse.ArgumentParser(description="Quantize the damage detection models for the fast tier")
+    parser.add_argument("images", help="Directory of calibration images")
+    parser.add_argument("--mode", choices=["int8", "dynamic"], default=settings.quantization_mode,
+                        help="int8 quantizes weights and activations, dynamic only weights")
+    parser.add_argument("--max-images", type=int, default=400, help="Images read from the directory")
+    parser.add_argument("--eval-fraction", type=float, default=0.25,
+                        help="Share of images held out for the accuracy report")
+    parser.add_argument("--artifact-dir", default=settings.artifact_dir,
+                        help="Where to write variants (default: next to each .h5 file)")
+    return parser.parse_args()
+
+def load_images(directory: Path, extensions, input_size, limit: int, fast: bool):
+    """Preprocess calibration images exactly as the API does"""
+    from app.preprocessing import preprocess_for_sizes
+
+    paths = sorted(
+        path for path in directory.rglob("*")
+        if path.is_file() and path.suffix.lower().lstrip(".") in extensions
+    )[:limit]
+
+    images = []
+    for path in paths:
+        try:
+            images.append(preprocess_for_sizes(path.read_bytes(), [input_size], fast=fast)[tuple(input_size)])
+        except Exception as e:
+            logger.warning(f"Skipping {path}: {e}")
+    return images
+
+def timed_predict(predict, images):
+    """Outputs for single-image calls and their mean latency in milliseconds"""
+    outputs = []
+    started = time.perf_counter()
+    for image in images:
+        outputs.append(np.asarray(predict(image))[0])
+    return np.stack(outputs), (time.perf_counter() - started) * 1000 / len(images)
+
+def main():
+    """Main function"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    args = parse_args()
+
+    from app.config import settings
+    from app.model_loader import MODEL_FILES
+    from app.artifacts import compare_outputs, passes_gate, quantize_model, write_report
+    from app.backends import TFLiteBackend
+    import tensorflow as tf
+
+    failed = 0
+    for model_name, (setting_name, label) in MODEL_FILES.items():
+        model_path = Path(settings.model_dir) / getattr(settings, setting_name)
+        if not model_path.exists():
+            logger.warning(f"{label} model not found: {model_path}")
+            continue
+
+        model = tf.keras.models.load_model(str(model_path))
+        input_size = (model.input_shape[2], model.input_shape[1])
+        images = load_images(Path(args.images), settings.allowed_extensions, input_size,
+                             args.max_images, settings.fast_preprocessing)
+        holdout = max(1, int(len(images) * args.eval_fraction))
+        if len(images) <= holdout:
+            logger.error(f"Need more than {holdout} calibration images, found {len(images)}")
+            sys.exit(1)
+        calibration, evaluation = images[:-holdout], images[-holdout:]
+
+        artifact = quantize_model(model_path, args.mode, calibration, args.artifact_dir)
+        runner = TFLiteBackend(num_threads=settings.backend_num_threads or settings.tf_intra_op_threads)
+        runner.load(artifact)
+
+        reference, float_ms = timed_predict(lambda image: model(image, training=False), evaluation)
+        candidate, quantized_ms = timed_predict(runner.run, evaluation)
+        metrics = compare_outputs(reference, candidate, features=model_name == "features")
+        passed = passes_gate(metrics, settings.quantization_min_agreement,
+                             settings.quantization_max_drift, settings.quantization_min_feature_similarity)
+
+        report = {
+            "model": model_name,
+            "source": model_path.name,
+            "mode": args.mode,
+            "calibration_images": len(calibration),
+            "metrics": metrics,
+            "float_ms": round(float_ms, 3),
+            "quantized_ms": round(quantized_ms, 3),
+            "speedup": round(float_ms / max(quantized_ms, 1e-9), 2),
+            "thresholds": {
+                "min_agreement": settings.quantization_min_agreement,
+                "max_drift": settings.quantization_max_drift,
+                "min_feature_similarity": settings.quantization_min_feature_similarity
+            },
+            "passed": passed,
+            "created": time.time()
+        }
+        write_report(artifact, report)
+
+        logger.info(f"{label} {args.mode}: {'PASSED' if passed else 'FAILED'} - {json.dumps(metrics)}, "
+                    f"{float_ms:.1f} ms -> {quantized_ms:.1f} ms per image")
+        if not passed:
+            failed += 1
+
+    if failed:
+        logger.error(f"{failed} variant(s) failed the accuracy gate and will not serve the fast tier")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+Offline bulk scoring for the Car Damage Detection models
+Scores a directory or manifest of claim images with parallel decoding,
+batched ModelManager inference and resumable columnar output
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+# Add the current directory to Python path
+current_dir = Path(__file__).parent
+sys.path.insert(0, str(current_dir))
+
+logger = logging.getLogger("score_images")
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+def parse_args():
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description="Score claim images offline with the damage detection models")
+    parser.add_argument("input", help="Directory of images or manifest file with one image path per line")
+    parser.add_argument("--output", required=True, help="Output directory for part files")
+    parser.add_argument("--format", choices=["parquet", "npz"], default="parquet" if PYARROW_AVAILABLE else "npz",
+                        help="Columnar output format (parquet needs pyarrow)")
+    parser.add_argument("--decode-workers", type=int, default=os.cpu_count() or 1,
+                        help="Parallel decode processes")
+    parser.add_argument("--batch-size", type=int, default=64, help="Images per forward pass")
+    parser.add_argument("--part-size", type=int, default=10000, help="Rows per output part file")
+    parser.add_argument("--max-memory-mb", type=int, default=2048,
+                        help="Cap on memory used by decoded images waiting for inference")
+    parser.add_argument("--include-features", action="store_true", help="Write the raw feature vectors")
+    parser.add_argument("--no-resume", action="store_true", help="Ignore parts written by a previous run")
+    parser.add_argument("--retry-failed", action="store_true",
+                        help="When resuming, score again images whose latest row recorded an error")
+    parser.add_argument("--progress-interval", type=float, default=10.0, help="Seconds between progress lines")
+    return parser.parse_args()
+
+def list_images(source: Path, extensions):
+    """Collect image paths from a directory tree or a manifest file"""
+    if source.is_dir():
+        return sorted(
+            str(path) for path in source.rglob("*")
+            if path.is_file() and path.suffix.lower().lstrip(".") in extensions
+        )
+
+    paths = []
+    with open(source, "r") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            path = Path(line)
+            paths.append(str(path if path.is_absolute() else source.parent / path))
+    return paths
+
+def decode_image_file(path: str, model_sizes, fast: bool):
+    """Decode worker: read and letterbox one image for every model size"""
+    from app.preprocessing import preprocess_for_sizes
+
+    try:
+        with open(path, "rb") as f:
+            image_bytes = f.read()
+        by_size = preprocess_for_sizes(image_bytes, list(model_sizes.values()), fast=fast)
+        return path, {name: by_size[tuple(size)] for name, size in model_sizes.items()}, None
+    except Exception as e:
+        return path, None, str(e)
+
+def read_part_errors(part_file: Path):
+    """(path, error) pairs of a committed part file"""
+    if part_file.suffix == ".parquet":
+        if not PYARROW_AVAILABLE:
+            raise RuntimeError(f"Reading {part_file.name} needs pyarrow: pip install pyarrow")
+        table = pq.read_table(part_file, columns=["path", "error"])
+        return list(zip(table.column("path").to_pylist(), table.column("error").to_pylist()))
+
+    import numpy as np
+
+    with np.load(part_file) as arrays:
+        return list(zip(arrays["path"].tolist(), arrays["error"].tolist()))
+
+def load_done_paths(output_dir: Path, retry_failed: bool = False):
+    """Paths already written by committed parts of a previous run
+
+    With retry_failed, paths whose latest row recorded an error are left out
+    so they are scored again.
+    """
+    done = set()
+    failed = set()
+    parts = 0
+    for paths_file in sorted(output_dir.glob("part-*.paths")):
+        part_stem = paths_file.name[:-len(".paths")]
+        part_files = list(output_dir.glob(f"{part_stem}.parquet")) + list(output_dir.glob(f"{part_stem}.npz"))
+        if not part_files:
+            continue
+        with open(paths_file, "r") as f:
+            part_paths = [line.rstrip("\n") for line in f]
+        done.update(part_paths)
+        if retry_failed:
+            # Parts are numbered in order, so a later row supersedes an earlier failure
+            failed.difference_update(part_paths)
+            failed.update(path for path, error in read_part_errors(part_files[0]) if error)
+        parts += 1
+
+    if failed:
+        logger.info(f"Retrying {len(failed)} images that failed in a previous run")
+    return done - failed, parts
+
+class ColumnarWriter:
+    """Buffers result rows and writes them as numbered part files"""
+
+    def __init__(self, output_dir: Path, output_format: str, part_size: int, first_part: int,
+                 class_names, include_features: bool):
+        self.output_dir = output_dir
+        self.output_format = output_format
+        self.part_size = part_size
+        self.part_number = first_part
+        self.class_names = class_names
+        self.include_features = include_features
+        self.rows = []
+
+    def add(self, path: str, results, error=None):
+        row = {"path": path, "error": error or ""}
+
+        damage = results.get("classification") if results else None
+        row["severity_class"] = damage["class"] if damage else ""
+        row["severity_confidence"] = damage["confidence"] if damage else float("nan")
+        for class_name in self.class_names["damage_severity"]:
+            row[f"severity_prob_{class_name}"] = damage["all_probabilities"][class_name] if damage else float("nan")
+
+        location = results.get("location") if results else None
+        row["location_class"] = location["location"] if location else ""
+        row["location_confidence"] = location["confidence"] if location else float("nan")
+        for class_name in self.class_names["damage_location"]:
+            row[f"location_prob_{class_name}"] = location["all_probabilities"][class_name] if location else float("nan")
+
+        confidences = [head["confidence"] for head in (damage, location) if head]
+        row["overall_confidence"] = sum(confidences) / len(confidences) if confidences else float("nan")
+
+        if self.include_features:
+            features = results.get("features") if results else None
+            row["features"] = features["features"] if features else []
+
+        self.rows.append(row)
+        if len(self.rows) >= self.part_size:
+            self.flush()
+
+    def flush(self):
+        """Write buffered rows; the part file appearing is what commits them"""
+        if not self.rows:
+            return
+
+        part_stem = f"part-{self.part_number:05d}"
+        columns = {name: [row[name] for row in self.rows] for name in self.rows[0]}
+
+        # Paths go first so a committed part always has its resume record
+        with open(self.output_dir / f"{part_stem}.paths", "w") as f:
+            f.writelines(f"{path}\n" for path in columns["path"])
+
+        if self.output_format == "parquet":
+            tmp_path = self.output_dir / f"{part_stem}.parquet.tmp"
+            pq.write_table(pa.table(columns), tmp_path)
+            tmp_path.replace(self.output_dir / f"{part_stem}.parquet")
+        else:
+            import numpy as np
+
+            arrays = {}
+            for name, values in columns.items():
+                if name == "features":
+                    width = max((len(v) for v in values), default=0)
+                    matrix = np.full((len(values), width), np.nan, dtype=np.float32)
+                    for i, vector in enumerate(values):
+                        matrix[i, :len(vector)] = vector
+                    arrays[name] = matrix
+                else:
+                    arrays[name] = np.asarray(values)
+            tmp_path = self.output_dir / f"{part_stem}.tmp.npz"
+            np.savez(tmp_path, **arrays)
+            tmp_path.replace(self.output_dir / f"{part_stem}.npz")
+
+        logger.info(f"Wrote {part_stem} with {len(self.rows)} rows")
+        self.part_number += 1
+        self.rows = []
+
+def main():
+    """Main function"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    args = parse_args()
+
+    if args.format == "parquet" and not PYARROW_AVAILABLE:
+        logger.error("Parquet output needs pyarrow: pip install pyarrow (or use --format npz)")
+        sys.exit(1)
+
+    # This job batches on its own and should not touch the server's cache or index
+    os.environ.setdefault("BATCHING_ENABLED", "false")
+    os.environ.setdefault("RESULT_CACHE_ENABLED", "false")
+    os.environ.setdefault("FEATURE_INDEX_ENABLED", "false")
+    os.environ.setdefault("WARMUP_BATCH_SIZES", json.dumps([args.batch_size]))
+
+    from app.config import settings
+
+    output_dir = Path(args.output)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    paths = list_images(Path(args.input), settings.allowed_extensions)
+    done, first_part = (set(), 0) if args.no_resume else load_done_paths(output_dir, args.retry_failed)
+    if args.no_resume:
+        first_part = len(list(output_dir.glob("part-*.paths")))
+    paths = [path for path in paths if path not in done]
+    logger.info(f"{len(paths)} images to score ({len(done)} already done)")
+    if not paths:
+        return
+
+    # Start decode processes before TensorFlow creates any threads in this one
+    decode_pool = ProcessPoolExecutor(
+        max_workers=args.decode_workers, mp_context=multiprocessing.get_context("spawn")
+    )
+
+    from app.model_loader import model_manager
+
+    if model_manager.inference_available:
+        model_manager.load_models()
+    if not model_manager.models:
+        logger.error("No models loaded - check MODEL_DIR and the inference backend installation")
+        sys.exit(1)
+
+    model_sizes = {name: tuple(model_manager.model_configs[name]["input_size"]) for name in model_manager.models}
+
+    # Bound decoded images in flight by the memory cap
+    bytes_per_image = sum(width * height * 3 * 4 for width, height in set(model_sizes.values()))
+    max_in_flight = max(args.batch_size, (args.max_memory_mb * 1024 * 1024) // bytes_per_image)
+    logger.info(f"Up to {max_in_flight} decoded images in flight, batches of {args.batch_size}")
+
+    writer = ColumnarWriter(output_dir, args.format, args.part_size, first_part,
+                            model_manager.class_names, args.include_features)
+
+    in_flight = deque()
+    next_path = 0
+    scored = 0
+    failed = 0
+    started = time.monotonic()
+    last_report = started
+    batch = []
+
+    def score_batch(batch):
+        """Score one batch and return how many of its images failed"""
+        try:
+            results = model_manager.analyze_preprocessed([arrays for _, arrays in batch])
+        except Exception as e:
+            # Record the batch as failed like decode errors, so --retry-failed can score it later
+            logger.error(f"Inference failed for a batch of {len(batch)} images: {e}")
+            for path, _ in batch:
+                writer.add(path, None, f"Inference failed: {e}")
+            return len(batch)
+        for (path, _), head_results in zip(batch, results):
+            writer.add(path, head_results)
+        return 0
+
+    try:
+        while next_path < len(paths) or in_flight:
+            # Keep the decode pool fed without exceeding the memory cap
+            while next_path < len(paths) and len(in_flight) < max_in_flight:
+                in_flight.append(decode_pool.submit(
+                    decode_image_file, paths[next_path], model_sizes, settings.fast_preprocessing
+                ))
+                next_path += 1
+
+            path, arrays, error = in_flight.popleft().result()
+            if error is not None:
+                writer.add(path, None, error)
+                failed += 1
+            else:
+                batch.append((path, arrays))
+
+            if len(batch) >= args.batch_size or (not in_flight and batch):
+                batch_failed = score_batch(batch)
+                scored += len(batch) - batch_failed
+                failed += batch_failed
+                batch = []
+
+            now = time.monotonic()
+            if now - last_report >= args.progress_interval:
+                rate = (scored + failed) / (now - started)
+                remaining = len(paths) - scored - failed
+                eta = remaining / rate if rate > 0 else float("inf")
+                logger.info(f"{scored + failed}/{len(paths)} images, {rate:.1f} img/s, "
+                            f"{failed} failed, ETA {eta / 60:.1f} min")
+                last_report = now
+
+        writer.flush()
+
+    finally:
+        decode_pool.shutdown(cancel_futures=True)
+
+    elapsed = time.monotonic() - started
+    logger.info(f"Scored {scored} images ({failed} failed) in {elapsed:.1f}s - "
+                f"{(scored + failed) / max(elapsed, 1e-9):.1f} img/s")
+
+if __name__ == "__main__":
+    main()
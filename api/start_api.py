@@ -6,7 +6,6 @@ Run this script to start the FastAPI backend server
 
 import os
 import sys
-import logging
 import subprocess
 from pathlib import Path
 
@@ -15,15 +14,11 @@ current_dir = Path(__file__).parent
 sys.path.insert(0, str(current_dir))
 
 def setup_logging():
-    """Setup logging configuration"""
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.StreamHandler(sys.stdout),
-            logging.FileHandler('api.log')
-        ]
-    )
+    """Setup logging configuration: queued writes to stdout and a rotating api.log"""
+    from app.config import settings
+    from app.logging_config import configure_logging
+    
+    configure_logging(log_file=settings.log_file or 'api.log')
 
 def check_requirements():
     """Check if all required packages are installed"""
@@ -95,13 +90,16 @@ def start_server():
     try:
         import uvicorn
         
+        from app.config import settings
+        
         # Start the server without auto-reload to prevent continuous file watching
         uvicorn.run(
             "app.main:app",
             host="0.0.0.0",
             port=8001,
             reload=False,  # Disable auto-reload to stop file watching
-            log_level="info"
+            log_level="info",
+            access_log=not settings.request_log_enabled  # The request summary line replaces it
         )
     except KeyboardInterrupt:
         print("\n\n🛑 Server stopped by user")
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Production launcher for the Car Damage Detection API
+Binds the listening socket once, prepares shared state in a parent process
+and forks one uvicorn worker per slot with its own TensorFlow thread budget.
+Models on fork-safe backends are loaded in the parent and shared copy-on-write
+"""
+
+import os
+import sys
+import gc
+import signal
+import socket
+import argparse
+import logging
+from pathlib import Path
+
+# Add the current directory to Python path
+current_dir = Path(__file__).parent
+sys.path.insert(0, str(current_dir))
+
+logger = logging.getLogger("start_production")
+
+# Backends whose loaded models keep working in forked children at one thread
+FORK_SAFE_BACKENDS = ("tflite", "onnx")
+
+def parse_args():
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description="Pre-fork launcher for the Car Damage Detection API")
+    parser.add_argument("--host", default="0.0.0.0", help="Interface to bind")
+    parser.add_argument("--port", type=int, default=8001, help="Port to bind")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Number of worker processes (default: the WORKERS setting, 0 = CPU count)")
+    parser.add_argument("--intra-op-threads", type=int, default=0,
+                        help="TensorFlow intra-op threads per worker (default: cores / workers)")
+    parser.add_argument("--inter-op-threads", type=int, default=1,
+                        help="TensorFlow inter-op threads per worker")
+    return parser.parse_args()
+
+def configure_environment(args) -> int:
+    """Split the cores between workers before TensorFlow is imported; returns the worker count"""
+    from app.config import settings
+
+    cores = os.cpu_count() or 1
+    workers = args.workers or settings.workers or cores
+    intra_op_threads = args.intra_op_threads or max(1, cores // workers)
+
+    # The settings object already exists, so update it as well as the environment workers inherit
+    settings.workers = workers
+    settings.tf_intra_op_threads = intra_op_threads
+    settings.tf_inter_op_threads = args.inter_op_threads
+    os.environ["WORKERS"] = str(workers)
+    os.environ["TF_INTRA_OP_THREADS"] = str(intra_op_threads)
+    os.environ["TF_INTER_OP_THREADS"] = str(args.inter_op_threads)
+    os.environ.setdefault("OMP_NUM_THREADS", str(intra_op_threads))
+
+    logger.info(f"{workers} workers on {cores} cores - "
+                f"{intra_op_threads} intra-op / {args.inter_op_threads} inter-op threads each")
+    return workers
+
+def warm_model_files():
+    """Read model files once so every worker loads them from the shared page cache"""
+    from app.config import settings
+
+    for model_file in (settings.classification_model, settings.location_model, settings.feature_model):
+        model_path = Path(settings.model_dir) / model_file
+        if not model_path.exists():
+            logger.warning(f"Model not found: {model_path}")
+            continue
+        with open(model_path, "rb") as f:
+            while f.read(8 * 1024 * 1024):
+                pass
+
+def preload_models():
+    """Load models in the parent when they survive fork, so workers share the weights
+
+    TFLite and ONNX Runtime limited to one thread start no thread pools, so
+    an interpreter or session built before fork keeps working in every child.
+    Keras and SavedModel start the TensorFlow runtime, which hangs after fork,
+    as does converting an .h5 file, so those cases load in each worker instead.
+    """
+    from app.config import settings
+    from app.artifacts import artifact_path, file_sha256
+    from app.model_loader import MODEL_FILES, model_manager
+
+    threads = settings.backend_num_threads or settings.tf_intra_op_threads
+    eager = [name for name in MODEL_FILES if name not in settings.lazy_models]
+    for model_name in eager:
+        backend = model_manager.backend_name(model_name)
+        if backend not in FORK_SAFE_BACKENDS or threads != 1:
+            logger.info(f"Models load in each worker ({backend} backend, {threads} threads per worker); "
+                        f"the parent only preloads {' or '.join(FORK_SAFE_BACKENDS)} models at 1 thread")
+            return False
+        model_path = Path(settings.model_dir) / getattr(settings, MODEL_FILES[model_name][0])
+        if model_path.suffix == ".h5" and model_path.exists() and not artifact_path(
+                model_path, backend, file_sha256(model_path), settings.artifact_dir).exists():
+            logger.info(f"Models load in each worker: {model_path.name} is not converted to {backend} yet "
+                        f"(run convert_models.py --format {backend})")
+            return False
+
+    for model_name in eager:
+        try:
+            model_manager.load_model(model_name)
+        except Exception:
+            pass  # Recorded in model_status; each worker retries it at startup
+    logger.info(f"Loaded {len(model_manager.models)} models in the parent, shared copy-on-write by the workers")
+    return True
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    """Create the listening socket shared by all workers"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+def run_worker(sock: socket.socket, app):
+    """Serve requests on the inherited socket until told to stop"""
+    import uvicorn
+
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+    from app.config import settings
+    
+    config = uvicorn.Config(app, log_level="info", access_log=not settings.request_log_enabled)
+    server = uvicorn.Server(config)
+    server.run(sockets=[sock])
+
+def spawn_worker(sock: socket.socket, app) -> int:
+    """Fork one worker process and return its pid in the parent"""
+    pid = os.fork()
+    if pid == 0:
+        try:
+            run_worker(sock, app)
+        finally:
+            os._exit(0)
+    logger.info(f"Started worker {pid}")
+    return pid
+
+def main():
+    """Main function"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    args = parse_args()
+    worker_count = configure_environment(args)
+
+    # Import the app in the parent so module import cost is paid once and shared.
+    # Models not preloaded here are loaded by each worker's startup hook after fork
+    from app.main import app
+
+    warm_model_files()
+    preload_models()
+    sock = bind_socket(args.host, args.port)
+    logger.info(f"Listening on http://{args.host}:{args.port}")
+
+    # Keep imported objects out of the cyclic GC so workers do not dirty shared pages
+    gc.collect()
+    gc.freeze()
+
+    workers = {spawn_worker(sock, app) for _ in range(worker_count)}
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    # Supervise workers and replace any that exit unexpectedly
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        workers.discard(pid)
+        if not stopping:
+            logger.warning(f"Worker {pid} exited with status {status}, restarting")
+            workers.add(spawn_worker(sock, app))
+
+    sock.close()
+    logger.info("All workers stopped")
+
+if __name__ == "__main__":
+    main()
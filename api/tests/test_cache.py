@@ -0,0 +1,135 @@
+import threading
+import time
+
+import pytest
+
+from app.cache import ResultCache
+from app.deadline import ClientDisconnected
+
+def wait_for_waiter(cache: ResultCache, key: str):
+    """Give the second caller time to block on the first caller's compute"""
+    deadline = time.monotonic() + 5
+    while key not in cache._inflight and time.monotonic() < deadline:
+        time.sleep(0.01)
+    time.sleep(0.1)
+
+def test_concurrent_callers_share_one_compute():
+    cache = ResultCache()
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(threading.current_thread().name)
+        release.wait(5)
+        return {"class": "minor"}
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(cache.get_or_compute("key", compute)))
+        for _ in range(3)
+    ]
+    for thread in threads:
+        thread.start()
+    wait_for_waiter(cache, "key")
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert results == [{"class": "minor"}] * 3
+    assert cache.stats()["misses"] == 3
+
+def test_waiter_takes_over_when_owner_is_abandoned():
+    cache = ResultCache()
+    owner_started = threading.Event()
+    disconnect = threading.Event()
+
+    def owner_compute():
+        owner_started.set()
+        disconnect.wait(5)
+        raise ClientDisconnected("the location model")
+
+    def waiter_compute():
+        return {"location": "front"}
+
+    owner_error = []
+    waiter_result = []
+
+    def owner():
+        try:
+            cache.get_or_compute("key", owner_compute)
+        except ClientDisconnected as e:
+            owner_error.append(e)
+
+    owner_thread = threading.Thread(target=owner)
+    owner_thread.start()
+    owner_started.wait(5)
+    waiter_thread = threading.Thread(
+        target=lambda: waiter_result.append(cache.get_or_compute("key", waiter_compute))
+    )
+    waiter_thread.start()
+    wait_for_waiter(cache, "key")
+
+    disconnect.set()
+    owner_thread.join(5)
+    waiter_thread.join(5)
+
+    assert len(owner_error) == 1
+    assert waiter_result == [{"location": "front"}]
+    assert cache.peek("key") == {"location": "front"}
+    assert not cache._inflight
+
+def test_waiters_share_other_errors():
+    cache = ResultCache()
+    owner_started = threading.Event()
+    fail = threading.Event()
+    waiter_calls = []
+
+    def owner_compute():
+        owner_started.set()
+        fail.wait(5)
+        raise ValueError("Model not loaded: location")
+
+    def waiter_compute():
+        waiter_calls.append(1)
+        return {}
+
+    errors = []
+
+    def call(compute):
+        try:
+            cache.get_or_compute("key", compute)
+        except ValueError as e:
+            errors.append(e)
+
+    owner_thread = threading.Thread(target=call, args=(owner_compute,))
+    owner_thread.start()
+    owner_started.wait(5)
+    waiter_thread = threading.Thread(target=call, args=(waiter_compute,))
+    waiter_thread.start()
+    wait_for_waiter(cache, "key")
+
+    fail.set()
+    owner_thread.join(5)
+    waiter_thread.join(5)
+
+    assert len(errors) == 2
+    assert not waiter_calls
+
+def test_peek_does_not_count():
+    cache = ResultCache()
+    cache.put("key", {"class": "minor"})
+
+    assert cache.peek("key") == {"class": "minor"}
+    assert cache.peek("other") is None
+    assert cache.stats()["hits"] == 0 and cache.stats()["misses"] == 0
+
+    assert cache.get("key") == {"class": "minor"}
+    assert cache.stats()["hits"] == 1
+
+@pytest.mark.parametrize("use_disk", [False, True])
+def test_put_then_get(tmp_path, use_disk):
+    cache = ResultCache(disk_dir=str(tmp_path) if use_disk else None)
+    cache.put("key", {"confidence": 0.5})
+
+    assert cache.get("key") == {"confidence": 0.5}
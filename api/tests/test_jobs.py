@@ -0,0 +1,81 @@
+import asyncio
+import json
+import sqlite3
+import time
+
+from app.admission import AdmissionRejected
+from app.jobs import JobRunner, JobStore
+
+def backdate(store: JobStore, job_id: str, seconds: float, *columns):
+    """Move a job's timestamps into the past"""
+    with sqlite3.connect(str(store.db_path)) as connection:
+        for column in columns:
+            connection.execute(f"UPDATE jobs SET {column} = {column} - ? WHERE id = ?", (seconds, job_id))
+
+def test_queued_job_times_out_when_no_worker_starts_it(tmp_path):
+    store = JobStore(tmp_path / "jobs.sqlite3", queue_timeout_seconds=60)
+    job_id = store.submit("comprehensive-analysis", {}, b"image")["job_id"]
+
+    store.maintain()
+    assert store.get(job_id)["status"] == "queued"
+
+    backdate(store, job_id, 120, "created_at")
+    store.maintain()
+    job = store.get(job_id)
+    assert job["status"] == "failed"
+    assert job["error"]["code"] == "JOB_TIMEOUT"
+
+def test_renewed_lease_keeps_job_with_its_worker(tmp_path):
+    store = JobStore(tmp_path / "jobs.sqlite3", lease_seconds=30)
+    job_id = store.submit("comprehensive-analysis", {}, b"image")["job_id"]
+    store.claim("worker-1")
+
+    backdate(store, job_id, 60, "started_at", "heartbeat_at")
+    assert store.renew(job_id, "worker-1")
+    store.maintain()
+    assert store.get(job_id)["status"] == "running"
+
+    backdate(store, job_id, 60, "heartbeat_at")
+    store.maintain()
+    assert store.get(job_id)["status"] == "queued"
+    assert not store.renew(job_id, "worker-1")
+
+def test_stale_worker_cannot_complete_a_job_it_lost(tmp_path):
+    store = JobStore(tmp_path / "jobs.sqlite3")
+    job_id = store.submit("comprehensive-analysis", {}, b"image")["job_id"]
+    store.claim("worker-1")
+    store.release(job_id, "worker-1")
+    store.claim("worker-2")
+
+    store.complete(job_id, "worker-1", result=b"{}")
+    assert store.get(job_id)["status"] == "running"
+
+    store.complete(job_id, "worker-2", result=json.dumps({"success": True}).encode())
+    job = store.get(job_id)
+    assert job["status"] == "succeeded"
+    assert job["attempts"] == 1
+
+def test_runner_requeues_jobs_shed_by_admission_control(tmp_path):
+    store = JobStore(tmp_path / "jobs.sqlite3")
+    calls = []
+
+    async def handler(params, image):
+        calls.append(image)
+        if len(calls) == 1:
+            raise AdmissionRejected(503, "SERVER_OVERLOADED", "Server overloaded", retry_after=0)
+        return b'{"success": true}'
+
+    async def run():
+        runner = JobRunner(store, {"comprehensive-analysis": handler}, poll_interval=0.01)
+        job_id = store.submit("comprehensive-analysis", {}, b"image")["job_id"]
+        runner.start()
+        deadline = time.monotonic() + 5
+        while store.get(job_id)["status"] != "succeeded" and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+        await runner.shutdown()
+        return store.get(job_id)
+
+    job = asyncio.run(run())
+    assert job["status"] == "succeeded"
+    assert job["attempts"] == 1
+    assert len(calls) == 2
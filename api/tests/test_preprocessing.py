@@ -0,0 +1,64 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from app.preprocessing import BufferPool, LetterboxedTensor, preprocess_for_sizes, preprocess_into
+from preprocessing_parity import CORPUS, check_parity, make_corpus
+
+def jpeg_bytes(width: int, height: int, seed: int = 0) -> bytes:
+    pixels = np.random.default_rng(seed).integers(0, 255, (height, width, 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, "JPEG")
+    return buffer.getvalue()
+
+@pytest.mark.parametrize("fast", [True, False])
+def test_preprocess_into_batch_rows_matches_per_image(fast):
+    images = [jpeg_bytes(320, 240, 0), jpeg_bytes(200, 300, 1)]
+    batch = np.empty((4, 128, 96, 3), dtype=np.float32)
+
+    for row, image_bytes in enumerate(images):
+        preprocess_into(image_bytes, {(96, 128): batch[row]}, fast=fast)
+
+    for row, image_bytes in enumerate(images):
+        expected = preprocess_for_sizes(image_bytes, [(96, 128)], fast=fast)[(96, 128)]
+        np.testing.assert_allclose(batch[row], expected[0], atol=1e-6)
+
+def test_pooled_buffers_are_reused():
+    pool = BufferPool()
+    image_bytes = jpeg_bytes(320, 240)
+
+    first = preprocess_for_sizes(image_bytes, [(64, 64)], fast=True, pool=pool)[(64, 64)]
+    pool.release(first)
+    second = preprocess_for_sizes(image_bytes, [(64, 64)], fast=True, pool=pool)[(64, 64)]
+
+    assert second is first
+
+def test_tensor_input_fills_slot():
+    pixels = np.random.default_rng(0).integers(0, 255, (64, 32, 3), dtype=np.uint8)
+    tensor = LetterboxedTensor(pixels.tobytes(), pixels.shape)
+    batch = np.zeros((2, 64, 32, 3), dtype=np.float32)
+
+    preprocess_into(tensor, {(32, 64): batch[1]})
+
+    np.testing.assert_allclose(batch[1], pixels / 255.0, atol=1e-6)
+    assert not batch[0].any()
+
+def test_tensor_shape_mismatch_releases_pooled_buffers():
+    pool = BufferPool()
+    tensor = LetterboxedTensor(bytes(64 * 32 * 3), (64, 32, 3))
+
+    with pytest.raises(ValueError):
+        preprocess_for_sizes(tensor, [(64, 64)], pool=pool)
+    assert pool._free[(1, 64, 64, 3)]
+
+@pytest.fixture(scope="module")
+def corpus():
+    return make_corpus()
+
+@pytest.mark.parametrize("name", [entry[0] for entry in CORPUS])
+def test_preprocessing_paths_match_original_letterbox(corpus, name):
+    passed, report = check_parity({name: corpus[name]}, [(256, 256)])
+
+    assert passed, report
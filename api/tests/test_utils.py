@@ -0,0 +1,28 @@
+from app.config import settings
+from app.utils import format_comprehensive_response
+
+def analysis(**versions):
+    result = {}
+    if "classification" in versions:
+        result["damage_classification"] = {
+            "class": "minor", "confidence": 0.8, "model_version": versions["classification"]
+        }
+    if "location" in versions:
+        result["damage_location"] = {
+            "location": "front", "confidence": 0.6, "model_version": versions["location"]
+        }
+    return result
+
+def test_model_version_reports_the_loaded_severity_head():
+    metadata = format_comprehensive_response(analysis(classification="v2", location="v1"))["metadata"]
+
+    assert metadata["model_version"] == "v2"
+    assert metadata["model_versions"] == {"damage_classification": "v2", "damage_location": "v1"}
+
+def test_model_version_falls_back_to_the_first_head_served():
+    metadata = format_comprehensive_response(analysis(location="v3"))["metadata"]
+
+    assert metadata["model_version"] == "v3"
+
+def test_model_version_without_heads_is_the_configured_one():
+    assert format_comprehensive_response({})["metadata"]["model_version"] == settings.model_version